@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import bot
+
+
+# =========================================================
+# Benchmark offline untuk jalur DB yang panas. Membuat store.db sintetis
+# (invoice, item, log, produk) lalu mengukur fungsi asli di bot.py dan
+# mencetak hasil JSON: throughput dan latency p50/p99 per operasi.
+#
+#   python bench.py --invoices 100000 --products 2000 --output bench.json
+# =========================================================
+OPEN_RATIO = 0.02
+SEED_CHUNK = 50000
+CLOSED_STATUSES = ("DONE", "EXPIRED", "CANCELLED")
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed=None, **extra):
+    ordered = sorted(samples)
+    total = elapsed if elapsed is not None else sum(samples)
+    result = {
+        "n": len(samples),
+        "total_s": round(total, 6),
+        "ops_per_s": round(len(samples) / total, 2) if total else None,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def timed(samples, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+# =========================================================
+# SEED
+# =========================================================
+def seed_products(cur, count):
+    cur.executemany(
+        "INSERT INTO products (name, price, stock, description) VALUES (?, ?, ?, ?)",
+        [
+            (f"Produk {index:06d}", random.randint(1, 500) * 1000, 1_000_000, f"Deskripsi produk {index}")
+            for index in range(count)
+        ]
+    )
+
+
+def seed_rows(product_count, invoice_count, days):
+    now = bot.now_dt()
+    for index in range(invoice_count):
+        created = now - timedelta(seconds=random.randint(0, days * 86400))
+        product_id = random.randint(1, product_count)
+        quantity = random.randint(1, 5)
+        price = 1000 * (product_id % 500 + 1)
+        status = "UNPAID" if random.random() < OPEN_RATIO else random.choice(CLOSED_STATUSES)
+        # Invoice terbuka diberi due_at di masa depan, jadi yang overdue hanya
+        # invoice yang sengaja dibuat oleh bench_expire.
+        if status == "UNPAID":
+            due = now + timedelta(minutes=random.randint(1, 30))
+        else:
+            due = created + timedelta(minutes=30)
+        code = f"INV-{created:%Y%m%d}-{bot.InvoiceCodeGenerator.encode(index)}"
+        yield (
+            index + 1, code, str(random.randint(1, 50000)), f"user{index % 50000}",
+            product_id, f"Produk {product_id - 1:06d}", quantity, price, quantity * price,
+            status, created.strftime("%Y-%m-%d %H:%M:%S"),
+            due.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+
+
+def seed_database(product_count, invoice_count, days):
+    conn = bot.get_conn()
+    cur = conn.cursor()
+
+    # Trigger dashboard/FTS dimatikan selama seed lalu dibuat ulang, jauh
+    # lebih cepat daripada menjalankan trigger per baris untuk jutaan invoice.
+    cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    triggers = cur.fetchall()
+    for name, _sql in triggers:
+        cur.execute(f"DROP TRIGGER {name}")
+
+    cur.execute("BEGIN")
+    seed_products(cur, product_count)
+    conn.commit()
+
+    rows = seed_rows(product_count, invoice_count, days)
+    while True:
+        chunk = [row for _, row in zip(range(SEED_CHUNK), rows)]
+        if not chunk:
+            break
+        cur.execute("BEGIN")
+        cur.executemany("""
+            INSERT INTO invoices (
+                id, invoice_code, user_id, username, product_id, product_name,
+                quantity, unit_price, total_price, status, created_at, due_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, chunk)
+        cur.executemany("""
+            INSERT INTO invoice_items (invoice_id, product_id, product_name, quantity, unit_price, total_price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(row[0], row[4], row[5], row[6], row[7], row[8]) for row in chunk])
+        cur.executemany("""
+            INSERT INTO activity_logs (
+                actor_id, actor_name, actor_role, action_type, target_type, target_value, detail, created_at
+            ) VALUES (?, ?, 'USER', 'CREATE_ORDER', 'INVOICE', ?, ?, ?)
+        """, [(row[2], row[3], row[1], f"{row[5]} x{row[6]}", row[10]) for row in chunk])
+        conn.commit()
+
+    cur.execute("BEGIN")
+    for _name, sql in triggers:
+        cur.execute(sql)
+    cur.execute("INSERT INTO invoices_fts (invoices_fts) VALUES ('rebuild')")
+    cur.execute("INSERT INTO activity_logs_fts (activity_logs_fts) VALUES ('rebuild')")
+    bot.seed_dashboard_stats(cur)
+    conn.commit()
+    cur.execute("ANALYZE")
+
+
+# =========================================================
+# BENCHMARKS
+# =========================================================
+def bench_create_and_confirm(iterations, product_count):
+    create_samples = []
+    confirm_samples = []
+    codes = []
+
+    for _ in range(iterations):
+        product_id = random.randint(1, product_count)
+        result = timed(create_samples, bot.create_invoice, "bench", "bench", [(product_id, 1)])
+        codes.append(result["invoice"][0])
+
+    for code in codes:
+        result = timed(confirm_samples, bot.confirm_payment_and_reduce_stock, code, "bench")
+        assert result["ok"], result
+
+    return summarize(create_samples), summarize(confirm_samples)
+
+
+def bench_expire(sweeps, batch, product_count):
+    samples = []
+    expired_total = 0
+    cur = bot.get_conn().cursor()
+
+    for _ in range(sweeps):
+        codes = [
+            bot.create_invoice("bench", "bench", [(random.randint(1, product_count), 1)])["invoice"][0]
+            for _ in range(batch)
+        ]
+        marks = ", ".join("?" * len(codes))
+        cur.execute("BEGIN")
+        cur.execute(
+            f"UPDATE invoices SET due_at = '2000-01-01 00:00:00' WHERE invoice_code IN ({marks})",
+            codes
+        )
+        bot.get_conn().commit()
+        expired_total += len(timed(samples, bot.expire_due_invoices))
+
+    return summarize(samples, invoices_per_sweep=batch, expired=expired_total)
+
+
+def bench_reads(iterations, product_count):
+    dashboard = []
+    pending_first = []
+    pending_next = []
+    by_name_sql = []
+    by_name_cache = []
+
+    for _ in range(iterations):
+        timed(dashboard, bot.get_dashboard_data)
+
+        page = timed(pending_first, bot.get_pending_invoices, bot.PAGE_SIZE)
+        if page.rows:
+            timed(pending_next, bot.get_pending_invoices, bot.PAGE_SIZE, page.rows[-1][0])
+
+        name = f"produk {random.randint(0, product_count - 1):06d}"
+        timed(by_name_sql, bot.get_product_by_name, name)
+        timed(by_name_cache, bot.product_catalog.find, name)
+
+    return {
+        "get_dashboard_data": summarize(dashboard),
+        "get_pending_invoices_first_page": summarize(pending_first),
+        "get_pending_invoices_next_page": summarize(pending_next),
+        "get_product_by_name_sql": summarize(by_name_sql),
+        "product_catalog_find": summarize(by_name_cache),
+    }
+
+
+async def bench_log_activity(iterations):
+    writer = bot.activity_log_writer
+    writer.start()
+    samples = []
+
+    start = time.perf_counter()
+    for index in range(iterations):
+        enqueue = time.perf_counter()
+        await bot.log_activity("bench", "bench", "SYSTEM", "BENCH", "INVOICE", f"INV-{index}", "bench")
+        samples.append(time.perf_counter() - enqueue)
+    await writer.flush()
+    elapsed = time.perf_counter() - start
+
+    await writer.stop()
+    return summarize(samples, elapsed, note="latency = enqueue, total_s termasuk flush ke disk")
+
+
+def bench_insert_logs(batches, batch_size):
+    samples = []
+    now_value = bot.now_str()
+    for _ in range(batches):
+        rows = [("bench", "bench", "SYSTEM", "BENCH", "INVOICE", "X", "bench", now_value)] * batch_size
+        timed(samples, bot.insert_activity_logs, rows)
+    return summarize(samples, rows_per_batch=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark jalur DB store bot")
+    parser.add_argument("--invoices", type=int, default=10000, help="jumlah invoice sintetis")
+    parser.add_argument("--products", type=int, default=1000, help="jumlah produk sintetis")
+    parser.add_argument("--days", type=int, default=90, help="rentang created_at invoice (hari)")
+    parser.add_argument("--iterations", type=int, default=1000, help="iterasi per operasi")
+    parser.add_argument("--sweeps", type=int, default=20, help="jumlah sweep expire")
+    parser.add_argument("--sweep-size", type=int, default=100, help="invoice expired per sweep")
+    parser.add_argument("--dir", help="folder database (default: folder sementara)")
+    parser.add_argument("--output", help="tulis JSON ke file ini (default: stdout)")
+    parser.add_argument("--seed", type=int, default=1, help="seed random")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = args.dir or tempfile.mkdtemp(prefix="storebot-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    bot.DB_NAME = os.path.join(workdir, "store.db")
+    bot.ARCHIVE_DB_NAME = os.path.join(workdir, "store_archive.db")
+    if os.path.exists(bot.DB_NAME):
+        sys.exit(f"{bot.DB_NAME} sudah ada; pakai --dir kosong")
+
+    try:
+        bot.init_db()
+        seed_start = time.perf_counter()
+        seed_database(args.products, args.invoices, args.days)
+        seed_seconds = time.perf_counter() - seed_start
+        bot.product_catalog.load(bot.get_all_products())
+
+        results = bench_reads(args.iterations, args.products)
+        results["create_invoice"], results["confirm_payment_and_reduce_stock"] = bench_create_and_confirm(
+            args.iterations, args.products
+        )
+        results["expire_due_invoices"] = bench_expire(args.sweeps, args.sweep_size, args.products)
+        results["insert_activity_logs_batch"] = bench_insert_logs(max(1, args.iterations // 100), 200)
+        results["log_activity"] = asyncio.run(bench_log_activity(args.iterations))
+
+        report = {
+            "config": vars(args) | {"dir": workdir},
+            "environment": {
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "db_synchronous": bot.DB_SYNCHRONOUS,
+            },
+            "seed_seconds": round(seed_seconds, 3),
+            "db_bytes": os.path.getsize(bot.DB_NAME),
+            "results": results,
+        }
+    finally:
+        bot.close_conn()
+        # Folder sementara dihapus; folder dari --dir dibiarkan untuk diperiksa.
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,25 @@
 import os
+import asyncio
+import bisect
+import collections
+import contextlib
+import functools
+import heapq
+import csv
+import io
+import logging
+import re
 import sqlite3
-import random
-import string
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
+import aiohttp
+from aiohttp import web
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
@@ -19,25 +34,664 @@ ADMIN_ROLE_NAME = os.getenv("ADMIN_ROLE_NAME", "Admin")
 HELPER_ROLE_NAME = os.getenv("HELPER_ROLE_NAME", "Helper")
 
 DB_NAME = "store.db"
+ARCHIVE_DB_NAME = "store_archive.db"
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "1000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+ADMIN_LOG_QUEUE_SIZE = int(os.getenv("ADMIN_LOG_QUEUE_SIZE", "500"))
+DM_CHANNEL_CACHE_SIZE = int(os.getenv("DM_CHANNEL_CACHE_SIZE", "1000"))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+LOG_MAX_ROWS = int(os.getenv("LOG_MAX_ROWS", "50000"))
+INVOICE_ARCHIVE_DAYS = int(os.getenv("INVOICE_ARCHIVE_DAYS", "30"))
+ARCHIVE_INTERVAL_MINUTES = float(os.getenv("ARCHIVE_INTERVAL_MINUTES", "60"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "200"))
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "500"))
+LOOP_STALL_ALERT_SECONDS = float(os.getenv("LOOP_STALL_ALERT_SECONDS", "300"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+log = logging.getLogger("storebot")
 
 intents = discord.Intents.default()
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+# =========================================================
+# METRICS
+# =========================================================
+# Counter dan histogram di memori, dibaca Prometheus dari endpoint HTTP lokal
+# /metrics (METRICS_PORT, 0 = mati). observe/inc juga dipanggil dari thread
+# DB, jadi dijaga lock. Nilai yang sudah ada di objek lain (panjang queue,
+# statistik cache) dibaca lewat collector saat render.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = collections.defaultdict(dict)
+        self._histograms = collections.defaultdict(dict)
+        self._collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._meta[name] = (kind, help_text)
+
+    def collector(self, name: str, kind: str, help_text: str, func):
+        # func() mengembalikan angka, atau dict {tuple (label, nilai): angka}.
+        self.describe(name, kind, help_text)
+        self._collectors.append((name, func))
+
+    def inc(self, metric: str, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[metric]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, metric: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms[metric]
+            state = series.get(key)
+            if state is None:
+                # Jumlah per bucket (non-kumulatif, terakhir = +Inf) lalu total nilai.
+                state = series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def _header(self, lines, name):
+        kind, help_text = self._meta[name]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: list(state) for key, state in series.items()}
+                for name, series in self._histograms.items()
+            }
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            self._header(lines, name)
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{format_labels(key)} {value}")
+
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name)
+            for key, state in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+                cumulative += state[len(self.buckets)]
+                lines.append(f"{name}_bucket{format_labels(key + (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(key)} {state[-1]}")
+                lines.append(f"{name}_count{format_labels(key)} {cumulative}")
+
+        for name, func in self._collectors:
+            try:
+                values = func()
+            except Exception:
+                log.exception("Gagal membaca metrik %s", name)
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            self._header(lines, name)
+            for key, value in sorted(values.items()):
+                if value is not None:
+                    lines.append(f"{name}{format_labels(key)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("storebot_handler_seconds", "histogram", "Durasi slash command, callback tombol/select dan submit modal")
+metrics.describe("storebot_handler_total", "counter", "Jumlah handler interaction per status")
+metrics.describe("storebot_task_seconds", "histogram", "Durasi satu iterasi task background")
+metrics.describe("storebot_task_total", "counter", "Jumlah iterasi task background per status")
+metrics.describe("storebot_db_seconds", "histogram", "Durasi fungsi database di thread DB")
+metrics.describe("storebot_db_wait_seconds", "histogram", "Waktu antre sebelum fungsi database mulai jalan")
+metrics.describe("storebot_db_errors_total", "counter", "Fungsi database yang melempar exception")
+metrics.describe("storebot_loop_lag_seconds", "histogram", "Keterlambatan heartbeat event loop")
+metrics.describe("storebot_loop_stalls_total", "counter", "Event loop macet melewati LOOP_STALL_MS")
+metrics.describe("storebot_sql_seconds", "histogram", "Durasi execute satu statement SQL per jenis statement")
+metrics.describe("storebot_discord_rest_seconds", "histogram", "Durasi request REST ke Discord")
+metrics.describe("storebot_discord_rest_total", "counter", "Request REST ke Discord per status HTTP")
+
+
+def instrument_handler(kind: str, name: str, func):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await func(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            metrics.observe("storebot_handler_seconds", time.perf_counter() - started, kind=kind, name=name)
+            metrics.inc("storebot_handler_total", kind=kind, name=name, status=status)
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def observe_command(interaction: discord.Interaction, command, status: str):
+    started = interaction.extras.get("started_at")
+    if started is None or command is None:
+        return
+    name = command.qualified_name
+    metrics.observe("storebot_handler_seconds", time.perf_counter() - started, kind="command", name=name)
+    metrics.inc("storebot_handler_total", kind="command", name=name, status=status)
+
+
+@contextlib.contextmanager
+def track_task(name: str):
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        metrics.observe("storebot_task_seconds", time.perf_counter() - started, task=name)
+        metrics.inc("storebot_task_total", task=name, status=status)
+
+
+# REST Discord (termasuk respon interaction dan followup) lewat satu
+# aiohttp session milik bot; durasinya diambil dari TraceConfig. ID dan token
+# di path diganti placeholder supaya jumlah label tetap kecil.
+REST_ID_PATTERN = re.compile(r"/\d{15,}")
+REST_TOKEN_PATTERN = re.compile(r"/[\w.-]{60,}")
+
+
+def rest_route(method: str, url) -> str:
+    path = REST_TOKEN_PATTERN.sub("/{token}", REST_ID_PATTERN.sub("/{id}", url.path))
+    return f"{method} {path}"
+
+
+async def on_rest_request_start(session, context, params):
+    context.started = time.perf_counter()
+
+
+async def on_rest_request_end(session, context, params):
+    route = rest_route(params.method, params.url)
+    metrics.observe("storebot_discord_rest_seconds", time.perf_counter() - context.started, route=route)
+    metrics.inc("storebot_discord_rest_total", route=route, status=params.response.status)
+
+
+async def on_rest_request_exception(session, context, params):
+    route = rest_route(params.method, params.url)
+    metrics.observe("storebot_discord_rest_seconds", time.perf_counter() - context.started, route=route)
+    metrics.inc("storebot_discord_rest_total", route=route, status="exception")
+
+
+rest_trace = aiohttp.TraceConfig()
+rest_trace.on_request_start.append(on_rest_request_start)
+rest_trace.on_request_end.append(on_rest_request_end)
+rest_trace.on_request_exception.append(on_rest_request_exception)
+
+
+# Semua view dan modal bot turun dari dua kelas ini supaya setiap callback
+# tombol/select dan submit modal tercatat di metrik.
+class StoreView(discord.ui.View):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for item in self.children:
+            self._instrument(item)
+
+    def add_item(self, item):
+        self._instrument(item)
+        return super().add_item(item)
+
+    def _instrument(self, item):
+        if hasattr(item.callback, "__wrapped__"):
+            return
+        func = getattr(item.callback, "callback", None)
+        name = f"{type(self).__name__}.{getattr(func, '__name__', type(item).__name__)}"
+        item.callback = instrument_handler("component", name, item.callback)
+
+
+class StoreModal(discord.ui.Modal):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_submit = instrument_handler("modal", type(self).__name__, self.on_submit)
+
+
+# Slash command: waktu mulai disimpan di interaction.extras, durasi dicatat
+# di on_app_command_completion (sukses) atau on_error (gagal).
+class StoreCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_command(interaction, interaction.command, "error")
+        await super().on_error(interaction, error)
+
+
+class MetricsServer:
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    def is_running(self):
+        return self._runner is not None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, self.port).start()
+        self._runner = runner
+        log.info("Endpoint metrik aktif di http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(
+            body=self.registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+
+
+class StoreBot(commands.Bot):
+    async def close(self):
+        archive_old_rows.cancel()
+        await expiry_scheduler.stop()
+        await admin_notifier.stop()
+        await metrics_server.stop()
+        await loop_watchdog.stop()
+        await super().close()
+        await activity_log_writer.stop()
+        await run_db(close_conn)
+        DB_EXECUTOR.shutdown(wait=True)
+
+
+bot = StoreBot(
+    command_prefix="!",
+    intents=intents,
+    tree_cls=StoreCommandTree,
+    http_trace=rest_trace
+)
 
 
 # =========================================================
 # DATABASE
 # =========================================================
+# Semua akses sqlite dijalankan di satu thread khusus supaya event loop
+# tidak pernah menunggu disk. Handler cukup `await run_db(fungsi, ...)`.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-db")
+
+# Koneksi dibuka sekali per thread lalu dipakai ulang, bukan connect/close
+# di setiap helper.
+_db_local = threading.local()
+
+
+# Setiap statement diukur lewat factory connection/cursor. Statement yang
+# lebih lama dari SLOW_QUERY_MS (0 = mati) ditulis ke log beserta parameter,
+# fungsi pemanggil dan EXPLAIN QUERY PLAN, lalu diringkas per SQL untuk
+# /querylambat. Yang diukur adalah execute (sampai baris pertama siap), bukan
+# fetch sisa baris.
+SQL_VERB = re.compile(r"\s*(\w+)")
+SQL_WHITESPACE = re.compile(r"\s+")
+SQL_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+EXPLAINABLE_SQL = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+
+def normalize_sql(sql: str) -> str:
+    # "IN (?, ?, ?)" dengan jumlah berbeda dianggap statement yang sama.
+    return SQL_PLACEHOLDER_LIST.sub("?, ...", SQL_WHITESPACE.sub(" ", sql).strip())
+
+
+def short_repr(value, limit: int = 200) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def explain_query(conn, sql: str, params):
+    if params is None or not sql.lstrip().upper().startswith(EXPLAINABLE_SQL):
+        return []
+    try:
+        # Cursor bawaan, supaya EXPLAIN sendiri tidak ikut diukur.
+        cur = sqlite3.Cursor(conn)
+        cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[3] for row in cur.fetchall()]
+    except sqlite3.Error:
+        return []
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, maxsize: int):
+        self.threshold = threshold_ms / 1000
+        self.maxsize = maxsize
+        self.total = 0
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __len__(self):
+        return len(self._stats)
+
+    def enabled(self):
+        return self.threshold > 0
+
+    def record(self, conn, sql: str, params, elapsed: float, caller: str):
+        key = normalize_sql(sql)
+        plan = explain_query(conn, sql, params)
+        log.warning(
+            "Query lambat %.1f ms di %s: %s | params=%s | plan=%s",
+            elapsed * 1000, caller, key, short_repr(params), " / ".join(plan) or "-"
+        )
+
+        with self._lock:
+            self.total += 1
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.maxsize:
+                    return
+                entry = self._stats[key] = {"count": 0, "total": 0.0, "max": 0.0}
+            entry["count"] += 1
+            entry["total"] += elapsed
+            if elapsed >= entry["max"]:
+                entry.update(max=elapsed, params=short_repr(params), caller=caller, plan=plan)
+
+    def top(self, limit: int, order: str = "total"):
+        with self._lock:
+            rows = sorted(self._stats.items(), key=lambda item: item[1][order], reverse=True)
+            return [(sql, dict(entry)) for sql, entry in rows[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.total = 0
+
+
+slow_queries = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_MAX_STATEMENTS)
+
+
+def find_sql_caller() -> str:
+    frame = sys._getframe(1)
+    while frame is not None and (
+        frame.f_code in SQL_WRAPPER_CODES or frame.f_code.co_filename == contextlib.__file__
+    ):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_code.co_name}:{frame.f_lineno}"
+
+
+def observe_query(conn, sql: str, params, elapsed: float):
+    match = SQL_VERB.match(sql)
+    metrics.observe("storebot_sql_seconds", elapsed, statement=match.group(1).upper() if match else "?")
+    if slow_queries.enabled() and elapsed >= slow_queries.threshold:
+        slow_queries.record(conn, sql, params, elapsed, find_sql_caller())
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_query(self.connection, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Untuk EXPLAIN cukup baris pertama; generator tidak bisa dibaca ulang.
+        sample = None
+        if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters:
+            sample = seq_of_parameters[0]
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_query(self.connection, sql, sample, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute bawaan tidak lewat Cursor.execute, jadi diarahkan
+    # manual ke cursor terukur.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+SQL_WRAPPER_CODES = {
+    find_sql_caller.__code__,
+    observe_query.__code__,
+    TimedCursor.execute.__code__,
+    TimedCursor.executemany.__code__,
+    TimedConnection.execute.__code__,
+    TimedConnection.executemany.__code__,
+}
+
+
+def open_conn():
+    synchronous = DB_SYNCHRONOUS if DB_SYNCHRONOUS in ("OFF", "NORMAL", "FULL", "EXTRA") else "NORMAL"
+    conn = sqlite3.connect(
+        DB_NAME,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_CACHED_STATEMENTS,
+        factory=TimedConnection
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_NAME,))
+    conn.execute("PRAGMA archive.journal_mode=WAL")
+    conn.execute(f"PRAGMA archive.synchronous={synchronous}")
+    return conn
+
+
 def get_conn():
-    return sqlite3.connect(DB_NAME)
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        conn = open_conn()
+        _db_local.conn = conn
+    return conn
 
 
-def init_db():
+def close_conn():
+    conn = getattr(_db_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _db_local.conn = None
+
+
+@contextlib.contextmanager
+def db_transaction():
     conn = get_conn()
     cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    _db_local.after_commit = []
+    try:
+        yield cur
+        # Commit di dalam try: kalau commit gagal (busy, disk penuh) transaksi
+        # tetap di-rollback, supaya koneksi thread DB tidak tertinggal di
+        # tengah transaksi dan BEGIN berikutnya tidak ikut gagal.
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        _db_local.after_commit = []
+        raise
+
+    callbacks, _db_local.after_commit = _db_local.after_commit, []
+    for callback in callbacks:
+        callback()
+
+
+@contextlib.contextmanager
+def db_savepoint(cur, name: str = "row"):
+    # Rollback sebagian di dalam db_transaction (dipakai operasi massal):
+    # kalau blok gagal, hanya perubahan dan callback after_commit milik blok
+    # ini yang dibatalkan, baris lain tetap di-commit.
+    mark = len(_db_local.after_commit)
+    cur.execute(f"SAVEPOINT {name}")
+    try:
+        yield cur
+    except BaseException:
+        cur.execute(f"ROLLBACK TO {name}")
+        cur.execute(f"RELEASE {name}")
+        del _db_local.after_commit[mark:]
+        raise
+    cur.execute(f"RELEASE {name}")
+
+
+def after_commit(callback):
+    # Dipakai untuk update cache di memori hanya kalau transaksi berhasil.
+    _db_local.after_commit.append(callback)
+
+
+_db_pending = 0
+
+
+async def run_db(func, *args, **kwargs):
+    global _db_pending
+    loop = asyncio.get_running_loop()
+    name = getattr(func, "__name__", type(func).__name__)
+    queued_at = time.perf_counter()
+
+    def call():
+        started = time.perf_counter()
+        metrics.observe("storebot_db_wait_seconds", started - queued_at)
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.inc("storebot_db_errors_total", func=name)
+            raise
+        finally:
+            metrics.observe("storebot_db_seconds", time.perf_counter() - started, func=name)
+
+    _db_pending += 1
+    try:
+        return await loop.run_in_executor(DB_EXECUTOR, call)
+    finally:
+        _db_pending -= 1
+
+
+# Helper transaksi dan run_db juga dilewati find_sql_caller, supaya BEGIN,
+# SAVEPOINT, dan query lewat run_db tercatat atas nama fungsi pemanggilnya.
+SQL_WRAPPER_CODES.update({
+    db_transaction.__wrapped__.__code__,
+    db_savepoint.__wrapped__.__code__,
+    *(const for const in run_db.__code__.co_consts if isinstance(const, type(run_db.__code__))),
+})
+
+
+# Pagination keyset: halaman berikut diambil dengan `id < id terakhir`
+# (atau `>` untuk urutan naik), halaman sebelumnya kebalikannya. Setiap
+# halaman cukup satu seek di index, sejauh apa pun user menggulir, beda
+# dengan OFFSET. Query menyisipkan {keyset} di WHERE dan {order} di ORDER BY.
+# Key bisa berupa row value, mis. "(rank, rowid)", dengan cursor tuple.
+PAGE_SIZE = 10
+Page = collections.namedtuple("Page", "rows has_prev has_next")
+
+
+def fetch_keyset_page(cur, sql: str, params, limit: int, cursor=None,
+                      backward: bool = False, descending: bool = True, key: str = "id"):
+    ascending = descending == backward
+    keyset = "1"
+    args = tuple(params)
+    if cursor is not None:
+        values = cursor if isinstance(cursor, tuple) else (cursor,)
+        marks = ", ".join("?" * len(values))
+        if len(values) > 1:
+            marks = f"({marks})"
+        keyset = f"{key} {'>' if ascending else '<'} {marks}"
+        args += values
+
+    cur.execute(sql.format(keyset=keyset, order="ASC" if ascending else "DESC"), args + (limit + 1,))
+    rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    if backward:
+        rows.reverse()
+        return Page(rows, more, True)
+    return Page(rows, cursor is not None, more)
+
+
+# Counter dashboard disimpan di tabel dashboard_stats dan di-update oleh
+# trigger pada setiap perubahan status invoice dan stok produk, jadi
+# dashboard cukup membaca beberapa baris. compute_dashboard_stats dipakai
+# untuk mengisi awal dan memperbaiki counter bila ada selisih.
+INVOICE_STATUSES = ("UNPAID", "PROCESSING", "PAID", "DONE", "EXPIRED", "CANCELLED")
+
+
+def compute_dashboard_stats(cur):
+    stats = {"products": 0, "stock": 0, "invoices": 0, "revenue": 0}
+    for status in INVOICE_STATUSES:
+        stats[f"status:{status}"] = 0
+
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(stock), 0) FROM products")
+    stats["products"], stats["stock"] = cur.fetchone()
 
     cur.execute("""
+        SELECT status, COUNT(*), COALESCE(SUM(total_price), 0)
+        FROM (
+            SELECT status, total_price FROM main.invoices
+            UNION ALL
+            SELECT status, total_price FROM archive.invoices
+        )
+        GROUP BY status
+    """)
+    for status, count, total in cur.fetchall():
+        stats[f"status:{status}"] = count
+        stats["invoices"] += count
+        if status in ("PAID", "DONE"):
+            stats["revenue"] += total
+    return stats
+
+
+def write_dashboard_stats(cur, stats):
+    cur.executemany("""
+        INSERT INTO dashboard_stats (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, list(stats.items()))
+
+
+def seed_dashboard_stats(cur):
+    write_dashboard_stats(cur, compute_dashboard_stats(cur))
+
+
+# Setiap migrasi hanya dijalankan sekali dan dicatat di tabel schema_version,
+# jadi store.db lama ikut ter-upgrade saat bot start. Tambahkan migrasi baru
+# di akhir list, jangan ubah yang sudah ada.
+SCHEMA_MIGRATIONS = [
+    (1, "tabel dasar", [
+        """
         CREATE TABLE IF NOT EXISTS products (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL UNIQUE,
@@ -45,9 +699,8 @@ def init_db():
             stock INTEGER NOT NULL DEFAULT 0,
             description TEXT
         )
-    """)
-
-    cur.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS invoices (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             invoice_code TEXT NOT NULL UNIQUE,
@@ -66,9 +719,8 @@ def init_db():
             handled_by TEXT,
             FOREIGN KEY(product_id) REFERENCES products(id)
         )
-    """)
-
-    cur.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS activity_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             actor_id TEXT NOT NULL,
@@ -80,10 +732,526 @@ def init_db():
             detail TEXT,
             created_at TEXT NOT NULL
         )
+        """,
+    ]),
+    (2, "index status/user/due_at, log created_at, nama produk NOCASE", [
+        "CREATE INDEX IF NOT EXISTS idx_invoices_status_due ON invoices(status, due_at, invoice_code)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_user ON invoices(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_logs_created_at ON activity_logs(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_products_name_nocase ON products(name COLLATE NOCASE)",
+    ]),
+    (3, "counter dashboard via trigger", [
+        """
+        CREATE TABLE IF NOT EXISTS dashboard_stats (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoice_insert AFTER INSERT ON invoices
+        BEGIN
+            UPDATE dashboard_stats SET value = value + 1
+            WHERE key IN ('invoices', 'status:' || NEW.status);
+            UPDATE dashboard_stats SET value = value + NEW.total_price
+            WHERE key = 'revenue' AND NEW.status IN ('PAID', 'DONE');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoice_update AFTER UPDATE OF status, total_price ON invoices
+        WHEN OLD.status IS NOT NEW.status OR OLD.total_price IS NOT NEW.total_price
+        BEGIN
+            UPDATE dashboard_stats SET value = value - 1 WHERE key = 'status:' || OLD.status;
+            UPDATE dashboard_stats SET value = value + 1 WHERE key = 'status:' || NEW.status;
+            UPDATE dashboard_stats
+            SET value = value
+                + (CASE WHEN NEW.status IN ('PAID', 'DONE') THEN NEW.total_price ELSE 0 END)
+                - (CASE WHEN OLD.status IN ('PAID', 'DONE') THEN OLD.total_price ELSE 0 END)
+            WHERE key = 'revenue';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_invoice_delete AFTER DELETE ON invoices
+        BEGIN
+            UPDATE dashboard_stats SET value = value - 1
+            WHERE key IN ('invoices', 'status:' || OLD.status);
+            UPDATE dashboard_stats SET value = value - OLD.total_price
+            WHERE key = 'revenue' AND OLD.status IN ('PAID', 'DONE');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_product_insert AFTER INSERT ON products
+        BEGIN
+            UPDATE dashboard_stats SET value = value + 1 WHERE key = 'products';
+            UPDATE dashboard_stats SET value = value + NEW.stock WHERE key = 'stock';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_product_update AFTER UPDATE OF stock ON products
+        WHEN OLD.stock IS NOT NEW.stock
+        BEGIN
+            UPDATE dashboard_stats SET value = value + NEW.stock - OLD.stock WHERE key = 'stock';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_stats_product_delete AFTER DELETE ON products
+        BEGIN
+            UPDATE dashboard_stats SET value = value - 1 WHERE key = 'products';
+            UPDATE dashboard_stats SET value = value - OLD.stock WHERE key = 'stock';
+        END
+        """,
+        seed_dashboard_stats,
+    ]),
+    (4, "reservasi stok per invoice", [
+        "ALTER TABLE invoices ADD COLUMN stock_reserved INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (5, "index invoice terbuka untuk pagination", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_invoices_open
+        ON invoices(id) WHERE status IN ('UNPAID', 'PROCESSING')
+        """,
+    ]),
+    (6, "full-text search invoice dan log aktivitas", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5(
+            invoice_code, username, product_name, notes,
+            content='invoices', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_insert
+        AFTER INSERT ON invoices
+        BEGIN
+            INSERT INTO invoices_fts (rowid, invoice_code, username, product_name, notes)
+            VALUES (new.id, new.invoice_code, new.username, new.product_name, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_delete
+        AFTER DELETE ON invoices
+        BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, invoice_code, username, product_name, notes)
+            VALUES ('delete', old.id, old.invoice_code, old.username, old.product_name, old.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_invoices_fts_update
+        AFTER UPDATE OF invoice_code, username, product_name, notes ON invoices
+        BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, invoice_code, username, product_name, notes)
+            VALUES ('delete', old.id, old.invoice_code, old.username, old.product_name, old.notes);
+            INSERT INTO invoices_fts (rowid, invoice_code, username, product_name, notes)
+            VALUES (new.id, new.invoice_code, new.username, new.product_name, new.notes);
+        END
+        """,
+        "INSERT INTO invoices_fts (invoices_fts) VALUES ('rebuild')",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS activity_logs_fts USING fts5(
+            actor_name, action_type, target_value, detail,
+            content='activity_logs', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_activity_logs_fts_insert
+        AFTER INSERT ON activity_logs
+        BEGIN
+            INSERT INTO activity_logs_fts (rowid, actor_name, action_type, target_value, detail)
+            VALUES (new.id, new.actor_name, new.action_type, new.target_value, new.detail);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_activity_logs_fts_delete
+        AFTER DELETE ON activity_logs
+        BEGIN
+            INSERT INTO activity_logs_fts (activity_logs_fts, rowid, actor_name, action_type, target_value, detail)
+            VALUES ('delete', old.id, old.actor_name, old.action_type, old.target_value, old.detail);
+        END
+        """,
+        "INSERT INTO activity_logs_fts (activity_logs_fts) VALUES ('rebuild')",
+    ]),
+    (7, "invoice arsip tetap dihitung di dashboard", [
+        # Invoice hanya dihapus dari tabel utama saat dipindah ke arsip, jadi
+        # counter dashboard tidak boleh ikut berkurang.
+        "DROP TRIGGER IF EXISTS trg_stats_invoice_delete",
+    ]),
+    (8, "item invoice untuk order keranjang", [
+        """
+        CREATE TABLE IF NOT EXISTS invoice_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price INTEGER NOT NULL,
+            total_price INTEGER NOT NULL,
+            FOREIGN KEY(invoice_id) REFERENCES invoices(id),
+            FOREIGN KEY(product_id) REFERENCES products(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items(invoice_id)",
+        """
+        INSERT INTO invoice_items (invoice_id, product_id, product_name, quantity, unit_price, total_price)
+        SELECT id, product_id, product_name, quantity, unit_price, total_price
+        FROM invoices
+        ORDER BY id
+        """,
+    ]),
+    (9, "index id invoice tertutup untuk job arsip", [
+        # Job arsip mengambil invoice tertutup urut id per batch; tanpa index
+        # ini setiap batch menyortir semua invoice tertutup di temp B-tree.
+        """
+        CREATE INDEX IF NOT EXISTS idx_invoices_closed_id ON invoices(id)
+        WHERE status IN ('DONE', 'EXPIRED', 'CANCELLED')
+        """,
+    ]),
+]
+
+
+def get_schema_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
     """)
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cur.fetchone()[0]
 
-    conn.commit()
-    conn.close()
+
+def migrate_db(conn):
+    cur = conn.cursor()
+    current = get_schema_version(cur)
+    applied = []
+
+    for version, description, steps in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, now_str())
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    if applied:
+        cur.execute("ANALYZE")
+    return applied
+
+
+# Data lama dipindah ke store_archive.db (di-attach sebagai `archive`) supaya
+# store.db tetap kecil. Skema arsip dibuat ulang setiap start kalau belum ada,
+# jadi file arsip boleh dipindah/diganti tanpa mengganggu migrasi utama.
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.activity_logs (
+        id INTEGER PRIMARY KEY,
+        actor_id TEXT NOT NULL,
+        actor_name TEXT NOT NULL,
+        actor_role TEXT NOT NULL,
+        action_type TEXT NOT NULL,
+        target_type TEXT NOT NULL,
+        target_value TEXT NOT NULL,
+        detail TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_logs_target ON activity_logs(target_value)",
+    """
+    CREATE TABLE IF NOT EXISTS archive.invoices (
+        id INTEGER PRIMARY KEY,
+        invoice_code TEXT NOT NULL UNIQUE,
+        user_id TEXT NOT NULL,
+        username TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price INTEGER NOT NULL,
+        total_price INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        due_at TEXT NOT NULL,
+        paid_at TEXT,
+        notes TEXT,
+        handled_by TEXT,
+        stock_reserved INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_invoices_user ON invoices(user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS archive.invoice_items (
+        id INTEGER PRIMARY KEY,
+        invoice_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price INTEGER NOT NULL,
+        total_price INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_invoice_items_invoice ON invoice_items(invoice_id)",
+    # Index full-text sendiri untuk invoice arsip, supaya /cari tetap
+    # menemukan invoice yang sudah dipindah dari tabel utama.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS archive.invoices_fts USING fts5(
+        invoice_code, username, product_name, notes,
+        content='invoices', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS archive.trg_archive_invoices_fts_insert
+    AFTER INSERT ON invoices
+    BEGIN
+        INSERT INTO invoices_fts (rowid, invoice_code, username, product_name, notes)
+        VALUES (new.id, new.invoice_code, new.username, new.product_name, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS archive.trg_archive_invoices_fts_delete
+    AFTER DELETE ON invoices
+    BEGIN
+        INSERT INTO invoices_fts (invoices_fts, rowid, invoice_code, username, product_name, notes)
+        VALUES ('delete', old.id, old.invoice_code, old.username, old.product_name, old.notes);
+    END
+    """,
+]
+
+
+def init_archive(conn):
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'invoices_fts'")
+        has_fts = cur.fetchone() is not None
+        for statement in ARCHIVE_SCHEMA:
+            cur.execute(statement)
+        if not has_fts:
+            # Arsip lama yang dibuat sebelum ada index full-text.
+            cur.execute("INSERT INTO archive.invoices_fts (invoices_fts) VALUES ('rebuild')")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def init_db():
+    # Arsip dibuat dulu karena compute_dashboard_stats ikut membaca arsip.
+    conn = get_conn()
+    init_archive(conn)
+    return migrate_db(conn)
+
+
+# =========================================================
+# CACHE
+# =========================================================
+# Salinan katalog produk di memori. Diisi saat startup dan di-update
+# setelah setiap commit yang mengubah produk/stok, jadi panel order dan
+# lookup produk tidak perlu baca disk. Ditulis dari thread DB, dibaca dari
+# event loop, makanya pakai lock. _names (nama casefold, id) selalu urut
+# untuk autocomplete: prefix dicari dengan bisect, substring dengan scan.
+class ProductCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = {}
+        self._ids = []
+        self._names = []
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def load(self, rows):
+        with self._lock:
+            self._by_id = {}
+            self._by_name = {}
+            self._ids = []
+            self._names = []
+            for row in sorted(rows):
+                self._store(row)
+
+    def put(self, row):
+        with self._lock:
+            self._store(row)
+
+    def set_stock(self, product_id: int, stock: int):
+        with self._lock:
+            row = self._by_id.get(product_id)
+            if row is not None:
+                self._store((row[0], row[1], row[2], stock, row[4]))
+
+    def _store(self, row):
+        if row[0] not in self._by_id:
+            bisect.insort(self._ids, row[0])
+            bisect.insort(self._names, (row[1].casefold(), row[0]))
+        self._by_id[row[0]] = row
+        self._by_name.setdefault(row[1].casefold(), row[0])
+
+    def get(self, product_id: int):
+        return self._by_id.get(product_id)
+
+    def find(self, name: str):
+        product_id = self._by_name.get(name.strip().casefold())
+        if product_id is None:
+            return None
+        return self._by_id.get(product_id)
+
+    def all(self):
+        with self._lock:
+            return list(self._by_id.values())
+
+    def search(self, query: str, limit: int = 25):
+        key = query.strip().casefold()
+        with self._lock:
+            if not key:
+                return [self._by_id[product_id] for _name, product_id in self._names[:limit]]
+
+            matches = []
+            start = bisect.bisect_left(self._names, (key,))
+            for name, product_id in self._names[start:]:
+                if not name.startswith(key) or len(matches) >= limit:
+                    break
+                matches.append(product_id)
+
+            if len(matches) < limit:
+                seen = set(matches)
+                for name, product_id in self._names:
+                    if key in name and product_id not in seen:
+                        matches.append(product_id)
+                        if len(matches) >= limit:
+                            break
+
+            return [self._by_id[product_id] for product_id in matches]
+
+    def page(self, limit: int, cursor: int | None = None, backward: bool = False):
+        # Keyset yang sama dengan fetch_keyset_page, tapi lewat bisect di
+        # daftar id yang sudah urut.
+        with self._lock:
+            if backward:
+                end = bisect.bisect_left(self._ids, cursor)
+                start = max(0, end - limit)
+            else:
+                start = 0 if cursor is None else bisect.bisect_right(self._ids, cursor)
+                end = start + limit
+            rows = [self._by_id[product_id] for product_id in self._ids[start:end]]
+            return Page(rows, start > 0, end < len(self._ids))
+
+
+product_catalog = ProductCatalog()
+
+
+# Resolusi user_id -> DM channel untuk notifikasi customer. Urutan cek:
+# cache user bot, cache member guild (intents.members aktif), baru REST
+# fetch_user kalau dua-duanya miss. DM channel yang sudah dibuka disimpan di
+# LRU terbatas. Hanya dipakai dari event loop, jadi tidak perlu lock.
+class UserResolver:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._channels = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+    def __len__(self):
+        return len(self._channels)
+
+    async def get_user(self, user_id: int):
+        user = bot.get_user(user_id)
+        if user is not None:
+            self.stats["user_cache"] += 1
+            return user
+
+        guild = bot.get_guild(GUILD_ID)
+        member = guild.get_member(user_id) if guild is not None else None
+        if member is not None:
+            self.stats["member_cache"] += 1
+            return member
+
+        self.stats["rest"] += 1
+        return await bot.fetch_user(user_id)
+
+    async def dm_channel(self, user_id: int):
+        channel = self._channels.get(user_id)
+        if channel is not None:
+            self._channels.move_to_end(user_id)
+            self.stats["dm_hit"] += 1
+            return channel
+
+        self.stats["dm_miss"] += 1
+        user = await self.get_user(user_id)
+        channel = user.dm_channel or await user.create_dm()
+        self._channels[user_id] = channel
+        while len(self._channels) > self.maxsize:
+            self._channels.popitem(last=False)
+        return channel
+
+    def hit_rates(self):
+        lookups = self.stats["user_cache"] + self.stats["member_cache"] + self.stats["rest"]
+        dm_total = self.stats["dm_hit"] + self.stats["dm_miss"]
+        return {
+            "user": (lookups - self.stats["rest"]) / lookups if lookups else None,
+            "dm_channel": self.stats["dm_hit"] / dm_total if dm_total else None,
+        }
+
+
+user_resolver = UserResolver(DM_CHANNEL_CACHE_SIZE)
+
+
+# Keranjang member, per user_id -> {product_id: qty}. Hanya di memori:
+# stok baru direservasi saat checkout, jadi keranjang yang hilang karena
+# restart atau kedaluwarsa tidak menahan stok apa pun. Hanya dipakai dari
+# event loop.
+class CartStore:
+    MAX_LINES = 10
+    TTL = timedelta(hours=1)
+
+    def __init__(self):
+        self._carts = {}
+
+    def __len__(self):
+        return len(self._carts)
+
+    def _prune(self):
+        cutoff = now_dt() - self.TTL
+        for user_id in [key for key, (updated_at, _lines) in self._carts.items() if updated_at < cutoff]:
+            del self._carts[user_id]
+
+    def get(self, user_id: int):
+        self._prune()
+        entry = self._carts.get(user_id)
+        return dict(entry[1]) if entry else {}
+
+    def add(self, user_id: int, product_id: int, quantity: int):
+        self._prune()
+        lines = self._carts.get(user_id, (None, {}))[1]
+        if product_id not in lines and len(lines) >= self.MAX_LINES:
+            return False
+        lines[product_id] = lines.get(product_id, 0) + quantity
+        self._carts[user_id] = (now_dt(), lines)
+        return True
+
+    def remove(self, user_id: int, product_id: int):
+        entry = self._carts.get(user_id)
+        if entry:
+            entry[1].pop(product_id, None)
+            if not entry[1]:
+                del self._carts[user_id]
+
+    def clear(self, user_id: int):
+        self._carts.pop(user_id, None)
+
+
+carts = CartStore()
 
 
 # =========================================================
@@ -97,14 +1265,87 @@ def now_str():
     return now_dt().strftime("%Y-%m-%d %H:%M:%S")
 
 
+def parse_dt(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+
 def rupiah(value: int) -> str:
     return f"Rp{value:,}".replace(",", ".")
 
 
+# Kode invoice INV-YYYYMMDD-XXXXXX: XXXXXX adalah base36 dari
+# (detik sejak tengah malam * 25000 + urutan), dipaksa naik terus per hari.
+# Hasilnya unik tanpa perlu cek ke DB dan urut waktu, jadi insert ke index
+# invoice_code selalu di ujung B-tree. Saat ganti hari (atau bot restart),
+# counter dilanjutkan dari kode terbesar hari itu di DB.
+class InvoiceCodeGenerator:
+    DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    WIDTH = 6
+    PER_SECOND = 25000
+    CAPACITY = 86400 * PER_SECOND  # < 36**6
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._day = None
+        self._last = -1
+
+    @classmethod
+    def encode(cls, value: int) -> str:
+        chars = []
+        for _ in range(cls.WIDTH):
+            value, digit = divmod(value, 36)
+            chars.append(cls.DIGITS[digit])
+        return "".join(reversed(chars))
+
+    @classmethod
+    def decode(cls, text: str):
+        value = 0
+        for char in text.upper():
+            digit = cls.DIGITS.find(char)
+            if digit < 0:
+                return None
+            value = value * 36 + digit
+        return value
+
+    def _seed(self, day: str):
+        prefix = f"INV-{day}-"
+        cur = get_conn().cursor()
+        # Kode acak versi lama (hari upgrade) hampir semuanya jatuh di dalam
+        # rentang ini (CAPACITY ~99% dari 36**6), jadi pada hari itu counter
+        # sengaja melompat ke atas kode acak terbesar dan urut dari sana;
+        # dengan begitu kode baru tidak pernah bentrok dengan kode lama.
+        # Hanya kode lama >= CAPACITY yang dilewati, dan counter memang tidak
+        # pernah sampai ke sana. Besoknya counter kembali mengikuti jam.
+        cur.execute(
+            "SELECT MAX(invoice_code) FROM invoices WHERE invoice_code BETWEEN ? AND ?",
+            (prefix + self.encode(0), prefix + self.encode(self.CAPACITY - 1))
+        )
+        latest = cur.fetchone()[0]
+        last = self.decode(latest[len(prefix):]) if latest else None
+        return -1 if last is None else last
+
+    def next(self) -> str:
+        now = now_dt()
+        day = now.strftime("%Y%m%d")
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+
+        with self._lock:
+            if day != self._day:
+                self._last = self._seed(day)
+                self._day = day
+            value = max(seconds * self.PER_SECOND, self._last + 1)
+            if value >= self.CAPACITY:
+                raise RuntimeError("Kapasitas kode invoice hari ini habis.")
+            self._last = value
+
+        return f"INV-{day}-{self.encode(value)}"
+
+
+invoice_codes = InvoiceCodeGenerator()
+
+
 def generate_invoice_code() -> str:
-    date_part = now_dt().strftime("%Y%m%d")
-    rand_part = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f"INV-{date_part}-{rand_part}"
+    return invoice_codes.next()
 
 
 def member_has_role(member: discord.Member, role_name: str) -> bool:
@@ -127,112 +1368,208 @@ def actor_role(member: discord.Member) -> str:
     return "USER"
 
 
-def log_activity(actor_id: str, actor_name: str, actor_role_name: str,
-                 action_type: str, target_type: str, target_value: str, detail: str = ""):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+def write_activity_logs(cur, rows):
+    cur.executemany("""
         INSERT INTO activity_logs (
             actor_id, actor_name, actor_role, action_type,
             target_type, target_value, detail, created_at
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    """, rows)
+
+
+def insert_activity_logs(rows):
+    with db_transaction() as cur:
+        write_activity_logs(cur, rows)
+
+
+async def log_activity(actor_id: str, actor_name: str, actor_role_name: str,
+                       action_type: str, target_type: str, target_value: str, detail: str = ""):
+    await activity_log_writer.put((
         actor_id, actor_name, actor_role_name, action_type,
         target_type, target_value, detail, now_str()
     ))
-    conn.commit()
-    conn.close()
 
 
-async def send_admin_log(content=None, embed=None):
-    channel = bot.get_channel(ADMIN_CHANNEL_ID)
-    if channel:
-        await channel.send(content=content, embed=embed)
+def send_admin_log(content=None, embed=None):
+    admin_notifier.send(content=content, embed=embed)
 
 
-def get_invoice_detail(invoice_code: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT invoice_code, username, product_name, quantity,
-               unit_price, total_price, status, created_at,
-               due_at, paid_at, notes, handled_by
-        FROM invoices
-        WHERE invoice_code = ?
-    """, (invoice_code,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+_background_tasks = set()
 
 
-def get_pending_invoices(limit=10):
-    conn = get_conn()
-    cur = conn.cursor()
+def spawn_background(coro, name: str | None = None):
+    # Simpan referensi task supaya tidak di-garbage-collect sebelum selesai.
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def deliver_dm(recipient, interaction: discord.Interaction | None = None,
+                     fallback: str | None = None, attempts: int = 3, **kwargs):
+    # Dijalankan di background setelah user sudah dapat balasan. Error
+    # sementara dicoba ulang; kalau tetap gagal (atau DM ditutup), kirim
+    # pesan fallback lewat followup interaction.
+    try:
+        target = recipient
+        if isinstance(recipient, int):
+            target = await user_resolver.dm_channel(recipient)
+
+        for attempt in range(attempts):
+            try:
+                await target.send(**kwargs)
+                return True
+            except discord.Forbidden:
+                break
+            except discord.HTTPException:
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(2 ** attempt)
+    except discord.HTTPException:
+        log.exception("Gagal resolve penerima DM %r", recipient)
+
+    if interaction is not None and fallback:
+        try:
+            await interaction.followup.send(fallback, ephemeral=True)
+        except discord.HTTPException:
+            log.exception("Gagal mengirim fallback DM lewat followup")
+    return False
+
+
+INVOICE_DETAIL_COLUMNS = """
+    invoice_code, username, product_name, quantity,
+    unit_price, total_price, status, created_at,
+    due_at, paid_at, notes, handled_by
+"""
+OPEN_INVOICE_STATUSES = ("UNPAID", "PROCESSING")
+
+
+def reserve_stock(cur, product_id: int, quantity: int):
+    # Potong stok hanya kalau cukup, dalam satu statement, supaya dua order
+    # bersamaan tidak bisa oversell. Mengembalikan stok baru atau None.
     cur.execute("""
-        SELECT invoice_code, username, product_name, quantity,
-               total_price, status, due_at
-        FROM invoices
-        WHERE status IN ('UNPAID', 'PROCESSING')
-        ORDER BY id DESC
-        LIMIT ?
-    """, (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+        UPDATE products
+        SET stock = stock - ?
+        WHERE id = ? AND stock >= ?
+        RETURNING stock
+    """, (quantity, product_id, quantity))
+    row = cur.fetchone()
+    if not row:
+        return None
 
+    after_commit(functools.partial(product_catalog.set_stock, product_id, row[0]))
+    return row[0]
 
-def get_dashboard_data():
-    conn = get_conn()
-    cur = conn.cursor()
 
-    cur.execute("SELECT COUNT(*) FROM products")
-    total_products = cur.fetchone()[0]
+class OrderRejected(Exception):
+    # Dilempar di dalam db_transaction supaya reservasi yang sudah terlanjur
+    # dipotong ikut di-rollback; pesannya dikembalikan sebagai result dict.
+    pass
 
-    cur.execute("SELECT COALESCE(SUM(stock), 0) FROM products")
-    total_stock = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(*) FROM invoices")
-    total_invoices = cur.fetchone()[0]
+def get_invoice_items(cur, invoice_id: int):
+    cur.execute("""
+        SELECT product_id, product_name, quantity
+        FROM invoice_items
+        WHERE invoice_id = ?
+        ORDER BY id
+    """, (invoice_id,))
+    return cur.fetchall()
+
+
+def format_stock_summary(stocks):
+    # Satu produk: cukup angkanya (seperti sebelum ada keranjang).
+    if len(stocks) == 1:
+        return stocks[0][1]
+    return ", ".join(f"{name}: {stock}" for name, stock in stocks)
+
+
+def release_reserved_stock(cur, items):
+    for product_id, quantity in items:
+        cur.execute(
+            "UPDATE products SET stock = stock + ? WHERE id = ? RETURNING stock",
+            (quantity, product_id)
+        )
+        row = cur.fetchone()
+        if row:
+            after_commit(functools.partial(product_catalog.set_stock, product_id, row[0]))
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'UNPAID'")
-    unpaid = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'PROCESSING'")
-    processing = cur.fetchone()[0]
+def get_invoice_detail(invoice_code: str):
+    conn = get_conn()
+    cur = conn.cursor()
+    for table in ("main.invoices", "archive.invoices"):
+        cur.execute(f"""
+            SELECT {INVOICE_DETAIL_COLUMNS}
+            FROM {table}
+            WHERE invoice_code = ?
+        """, (invoice_code,))
+        row = cur.fetchone()
+        if row:
+            return row
+    return None
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'PAID'")
-    paid = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'DONE'")
-    done = cur.fetchone()[0]
+def get_invoice_owner(invoice_code: str):
+    conn = get_conn()
+    cur = conn.cursor()
+    for table in ("main.invoices", "archive.invoices"):
+        cur.execute(f"SELECT user_id FROM {table} WHERE invoice_code = ?", (invoice_code,))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+    return None
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'EXPIRED'")
-    expired = cur.fetchone()[0]
 
-    cur.execute("SELECT COUNT(*) FROM invoices WHERE status = 'CANCELLED'")
-    cancelled = cur.fetchone()[0]
+def get_pending_invoices(limit=PAGE_SIZE, cursor=None, backward=False):
+    conn = get_conn()
+    cur = conn.cursor()
+    return fetch_keyset_page(cur, """
+        SELECT id, invoice_code, username, product_name, quantity,
+               total_price, status, due_at
+        FROM invoices
+        WHERE status IN ('UNPAID', 'PROCESSING') AND {keyset}
+        ORDER BY id {order}
+        LIMIT ?
+    """, (), limit, cursor, backward)
 
-    cur.execute("SELECT COALESCE(SUM(total_price), 0) FROM invoices WHERE status IN ('PAID', 'DONE')")
-    revenue = cur.fetchone()[0]
 
-    conn.close()
+def get_dashboard_data():
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT key, value FROM dashboard_stats")
+    stats = dict(cur.fetchall())
 
     return {
-        "total_products": total_products,
-        "total_stock": total_stock,
-        "total_invoices": total_invoices,
-        "unpaid": unpaid,
-        "processing": processing,
-        "paid": paid,
-        "done": done,
-        "expired": expired,
-        "cancelled": cancelled,
-        "revenue": revenue,
+        "total_products": stats.get("products", 0),
+        "total_stock": stats.get("stock", 0),
+        "total_invoices": stats.get("invoices", 0),
+        "unpaid": stats.get("status:UNPAID", 0),
+        "processing": stats.get("status:PROCESSING", 0),
+        "paid": stats.get("status:PAID", 0),
+        "done": stats.get("status:DONE", 0),
+        "expired": stats.get("status:EXPIRED", 0),
+        "cancelled": stats.get("status:CANCELLED", 0),
+        "revenue": stats.get("revenue", 0),
     }
 
 
-def build_dashboard_embed():
-    data = get_dashboard_data()
+def check_dashboard_stats(repair: bool = True):
+    with db_transaction() as cur:
+        cur.execute("SELECT key, value FROM dashboard_stats")
+        stored = dict(cur.fetchall())
+        actual = compute_dashboard_stats(cur)
+
+        mismatches = {
+            key: (stored.get(key, 0), value)
+            for key, value in actual.items()
+            if stored.get(key, 0) != value
+        }
+        if repair and mismatches:
+            write_dashboard_stats(cur, actual)
+    return mismatches
+
+
+def build_dashboard_embed(data):
     embed = discord.Embed(
         title="Dashboard Bot Toko",
         color=discord.Color.gold(),
@@ -252,8 +1589,7 @@ def build_dashboard_embed():
     return embed
 
 
-def build_pending_embed(limit=15):
-    rows = get_pending_invoices(limit)
+def build_pending_embed(rows):
     embed = discord.Embed(
         title="Pending / Processing Invoice",
         color=discord.Color.orange(),
@@ -264,7 +1600,7 @@ def build_pending_embed(limit=15):
         embed.description = "Tidak ada invoice pending."
         return embed
 
-    for code, username, product_name, qty, total, status, due_at in rows:
+    for _invoice_id, code, username, product_name, qty, total, status, due_at in rows:
         embed.add_field(
             name=f"{code} | {status}",
             value=f"{username}\n{product_name} x{qty}\n{rupiah(total)}\nDue: {due_at}",
@@ -273,183 +1609,770 @@ def build_pending_embed(limit=15):
     return embed
 
 
-def build_invoice_embed(row):
-    (
-        invoice_code, username, product_name, quantity,
-        unit_price, total_price, status, created_at,
-        due_at, paid_at, notes, handled_by
-    ) = row
+def build_invoice_embed(row):
+    (
+        invoice_code, username, product_name, quantity,
+        unit_price, total_price, status, created_at,
+        due_at, paid_at, notes, handled_by
+    ) = row
+
+    color = discord.Color.orange()
+    if status == "PAID":
+        color = discord.Color.green()
+    elif status == "DONE":
+        color = discord.Color.dark_green()
+    elif status == "PROCESSING":
+        color = discord.Color.blurple()
+    elif status == "CANCELLED":
+        color = discord.Color.red()
+    elif status == "EXPIRED":
+        color = discord.Color.dark_red()
+
+    embed = discord.Embed(title="Detail Invoice", color=color)
+    embed.add_field(name="No. Invoice", value=invoice_code, inline=False)
+    embed.add_field(name="Customer", value=username, inline=False)
+    embed.add_field(name="Produk", value=product_name, inline=False)
+    embed.add_field(name="Qty", value=str(quantity), inline=True)
+    # Invoice keranjang berisi beberapa produk, harga satuan ada di rinciannya.
+    embed.add_field(name="Harga Satuan", value=rupiah(unit_price) if unit_price else "-", inline=True)
+    embed.add_field(name="Total", value=rupiah(total_price), inline=False)
+    embed.add_field(name="Status", value=status, inline=True)
+    embed.add_field(name="Dibuat", value=created_at, inline=True)
+    embed.add_field(name="Batas Bayar", value=due_at, inline=True)
+    embed.add_field(name="Paid At", value=paid_at if paid_at else "-", inline=False)
+    embed.add_field(name="Ditangani Oleh", value=handled_by if handled_by else "-", inline=False)
+    embed.add_field(name="Catatan", value=notes if notes else "-", inline=False)
+    return embed
+
+
+def build_bot_stats_embed():
+    stats = user_resolver.stats
+    rates = user_resolver.hit_rates()
+
+    def percent(value):
+        return "-" if value is None else f"{value:.1%}"
+
+    embed = discord.Embed(title="Statistik Bot", color=discord.Color.teal())
+    embed.add_field(
+        name="Lookup User",
+        value=(
+            f"Cache user: **{stats['user_cache']}**\n"
+            f"Cache member: **{stats['member_cache']}**\n"
+            f"REST: **{stats['rest']}**\n"
+            f"Hit rate: **{percent(rates['user'])}**"
+        ),
+        inline=True
+    )
+    embed.add_field(
+        name="DM Channel",
+        value=(
+            f"Hit: **{stats['dm_hit']}**\n"
+            f"Miss: **{stats['dm_miss']}**\n"
+            f"Di cache: **{len(user_resolver)}/{user_resolver.maxsize}**\n"
+            f"Hit rate: **{percent(rates['dm_channel'])}**"
+        ),
+        inline=True
+    )
+    embed.add_field(
+        name="Notifikasi Admin",
+        value=(
+            f"Terkirim: **{admin_notifier.sent_messages}**\n"
+            f"Dibuang: **{admin_notifier.dropped}**"
+        ),
+        inline=True
+    )
+    embed.add_field(
+        name="Event Loop",
+        value=(
+            f"Macet: **{loop_watchdog.stalls}**\n"
+            f"Lag maks: **{loop_watchdog.max_lag * 1000:.0f} ms**\n"
+            f"Alert ditahan: **{loop_watchdog.suppressed}**"
+        ),
+        inline=True
+    )
+    return embed
+
+
+def build_slow_query_embed(rows, order: str):
+    embed = discord.Embed(
+        title="Query Lambat",
+        description=(
+            f"Ambang: **{slow_queries.threshold * 1000:g} ms** | "
+            f"Tercatat: **{slow_queries.total}** kali, **{len(slow_queries)}** statement\n"
+            f"Urut: **{order}**"
+        ),
+        color=discord.Color.dark_orange()
+    )
+
+    if not slow_queries.enabled():
+        embed.description = "Log query lambat nonaktif (SLOW_QUERY_MS=0)."
+        return embed
+
+    if not rows:
+        embed.add_field(name="Kosong", value="Belum ada query yang melewati ambang.", inline=False)
+        return embed
+
+    for index, (sql, entry) in enumerate(rows, start=1):
+        plan = " / ".join(entry["plan"]) or "-"
+        embed.add_field(
+            name=(
+                f"#{index} {entry['count']}x | total {entry['total'] * 1000:.0f} ms | "
+                f"rata2 {entry['total'] / entry['count'] * 1000:.1f} ms | maks {entry['max'] * 1000:.1f} ms"
+            )[:256],
+            value=(
+                f"```sql\n{sql[:250]}\n```"
+                f"Pemanggil: `{entry['caller']}`\n"
+                f"Params: `{entry['params'][:80]}`\n"
+                f"Plan: `{plan[:120]}`"
+            )[:1024],
+            inline=False
+        )
+    return embed
+
+
+def build_loop_stall_embed(stalled: float, stack: str, suppressed: int):
+    # Bagian paling dalam stack (kode yang sedang memblokir) ada di akhir.
+    stack = stack[-3800:]
+    embed = discord.Embed(
+        title="Event Loop Macet",
+        description=(
+            f"Loop tidak berdetak **>= {stalled * 1000:.0f} ms**. "
+            f"Stack thread loop saat terdeteksi:\n```py\n{stack}\n```"
+        ),
+        color=discord.Color.red()
+    )
+    if suppressed:
+        embed.set_footer(text=f"{suppressed} kejadian sebelumnya tidak dikirim (rate limit)")
+    return embed
+
+
+def build_payment_dm_embed(invoice_code: str, result):
+    embed = discord.Embed(title="Pembayaran Diterima", color=discord.Color.green())
+    embed.add_field(name="Invoice", value=invoice_code, inline=False)
+    embed.add_field(name="Produk", value=result["product_name"], inline=False)
+    embed.add_field(name="Qty", value=str(result["quantity"]), inline=True)
+    embed.add_field(name="Total", value=rupiah(result["total_price"]), inline=True)
+    embed.add_field(name="Status", value="PAID", inline=True)
+    return embed
+
+
+def apply_invoice_status(cur, invoice_code: str, new_status: str, handler: str, notes: str | None = None):
+    # Dipanggil di dalam transaksi. Mengembalikan status lama, atau None
+    # kalau invoice tidak ada.
+    paid_at = None
+    if new_status == "PAID":
+        paid_at = now_str()
+
+    cur.execute("""
+        SELECT id, status, stock_reserved
+        FROM invoices
+        WHERE invoice_code = ?
+    """, (invoice_code,))
+    existing = cur.fetchone()
+    if not existing:
+        return None
+
+    invoice_id, old_status, stock_reserved = existing
+
+    # Reservasi stok dilepas kalau invoice aktif dibatalkan/expired, dan
+    # dianggap terpakai kalau invoice dibayar/selesai.
+    if stock_reserved and old_status in OPEN_INVOICE_STATUSES:
+        if new_status in ("CANCELLED", "EXPIRED"):
+            release_reserved_stock(cur, [
+                (product_id, quantity)
+                for product_id, _name, quantity in get_invoice_items(cur, invoice_id)
+            ])
+            stock_reserved = 0
+        elif new_status in ("PAID", "DONE"):
+            stock_reserved = 0
+
+    cur.execute("""
+        UPDATE invoices
+        SET status = ?, handled_by = ?, notes = COALESCE(?, notes),
+            paid_at = COALESCE(?, paid_at), stock_reserved = ?
+        WHERE id = ?
+    """, (new_status, handler, notes, paid_at, stock_reserved, invoice_id))
+    return old_status
+
+
+def update_invoice_status(invoice_code: str, new_status: str, handler: str, notes: str | None = None):
+    with db_transaction() as cur:
+        old_status = apply_invoice_status(cur, invoice_code, new_status, handler, notes)
+    return 0 if old_status is None else 1
+
+
+def apply_payment(cur, invoice_code: str, handler: str):
+    # Dipanggil di dalam transaksi; gagal = OrderRejected (caller yang
+    # me-rollback, baik seluruh transaksi maupun savepoint per baris).
+    cur.execute("""
+        SELECT id, user_id, username, product_name, quantity,
+               total_price, status, stock_reserved
+        FROM invoices
+        WHERE invoice_code = ?
+    """, (invoice_code,))
+    row = cur.fetchone()
+
+    if not row:
+        raise OrderRejected("Invoice tidak ditemukan.")
+
+    (
+        invoice_id, user_id, username, product_name,
+        quantity, total_price, status, stock_reserved
+    ) = row
+
+    if status in ("PAID", "DONE"):
+        raise OrderRejected("Invoice sudah dibayar/diselesaikan.")
+
+    if status in ("CANCELLED", "EXPIRED"):
+        raise OrderRejected("Invoice sudah tidak aktif.")
+
+    stocks = []
+    for product_id, item_name, item_quantity in get_invoice_items(cur, invoice_id):
+        if stock_reserved:
+            # Stok sudah dipotong saat order, konfirmasi cukup mengunci reservasi.
+            cur.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+            product = cur.fetchone()
+            new_stock = product[0] if product else 0
+        else:
+            # Invoice lama (sebelum ada reservasi) masih memotong stok di sini.
+            new_stock = reserve_stock(cur, product_id, item_quantity)
+            if new_stock is None:
+                cur.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+                product = cur.fetchone()
+                if not product:
+                    raise OrderRejected(f"Produk {item_name} tidak ditemukan.")
+                raise OrderRejected(f"Stok {item_name} tidak cukup. Stok sekarang: {product[0]}")
+        stocks.append((item_name, new_stock))
+
+    cur.execute("""
+        UPDATE invoices
+        SET status = 'PAID', paid_at = ?, handled_by = ?, stock_reserved = 0
+        WHERE id = ?
+    """, (now_str(), handler, invoice_id))
+
+    return {
+        "ok": True,
+        "user_id": user_id,
+        "username": username,
+        "product_name": product_name,
+        "quantity": quantity,
+        "total_price": total_price,
+        "new_stock": format_stock_summary(stocks)
+    }
+
+
+def confirm_payment_and_reduce_stock(invoice_code: str, handler: str):
+    try:
+        with db_transaction() as cur:
+            return apply_payment(cur, invoice_code, handler)
+    except OrderRejected as e:
+        return {"ok": False, "message": str(e)}
+
+
+# Operasi massal admin: semua baris diproses dalam satu transaksi, tiap
+# baris di savepoint sendiri supaya satu baris gagal tidak membatalkan yang
+# lain. Hasil per baris dikembalikan sebagai (kunci, result dict).
+BULK_MAX_ROWS = 200
+
+
+def bulk_confirm_payment(invoice_codes, handler: str):
+    results = []
+    with db_transaction() as cur:
+        for invoice_code in invoice_codes:
+            try:
+                with db_savepoint(cur):
+                    result = apply_payment(cur, invoice_code, handler)
+                result["message"] = f"PAID, stok sisa {result['new_stock']}"
+            except OrderRejected as e:
+                result = {"ok": False, "message": str(e)}
+            results.append((invoice_code, result))
+    return results
+
+
+def bulk_cancel_invoices(invoice_codes, handler: str, notes: str | None = None):
+    results = []
+    with db_transaction() as cur:
+        for invoice_code in invoice_codes:
+            try:
+                with db_savepoint(cur):
+                    old_status = apply_invoice_status(cur, invoice_code, "CANCELLED", handler, notes)
+                    if old_status is None:
+                        raise OrderRejected("Invoice tidak ditemukan.")
+                    if old_status in ("CANCELLED", "EXPIRED"):
+                        raise OrderRejected("Invoice sudah tidak aktif.")
+                result = {"ok": True, "message": f"{old_status} → CANCELLED"}
+            except OrderRejected as e:
+                result = {"ok": False, "message": str(e)}
+            results.append((invoice_code, result))
+    return results
+
+
+def bulk_set_stock(rows):
+    # rows: (nama, stok) dengan stok "25" (set) atau "+25" / "-3" (tambah/kurangi).
+    results = []
+    with db_transaction() as cur:
+        for name, value in rows:
+            try:
+                amount = int(value)
+            except ValueError:
+                results.append((name, {"ok": False, "message": f"Stok '{value}' bukan angka."}))
+                continue
+
+            if not value.startswith(("+", "-")) and amount < 0:
+                results.append((name, {"ok": False, "message": "Stok tidak boleh negatif."}))
+                continue
+
+            # Nama dicocokkan tanpa beda huruf besar/kecil, tapi produk "Pet"
+            # dan "PET" bisa sama-sama ada: pakai yang persis sama, kalau tidak
+            # ada dan kandidatnya lebih dari satu, baris ditolak.
+            cur.execute("SELECT id, name FROM products WHERE name = ? COLLATE NOCASE", (name,))
+            candidates = cur.fetchall()
+            exact = [product_id for product_id, product_name in candidates if product_name == name]
+            if not candidates:
+                results.append((name, {"ok": False, "message": "Produk tidak ditemukan."}))
+                continue
+            if not exact and len(candidates) > 1:
+                names = ", ".join(product_name for _product_id, product_name in candidates)
+                results.append((name, {"ok": False, "message": f"Nama ambigu ({names}), tulis persis."}))
+                continue
+            product_id = exact[0] if exact else candidates[0][0]
+
+            if value.startswith(("+", "-")):
+                cur.execute("""
+                    UPDATE products
+                    SET stock = stock + ?
+                    WHERE id = ? AND stock + ? >= 0
+                    RETURNING id, stock
+                """, (amount, product_id, amount))
+            else:
+                cur.execute("""
+                    UPDATE products
+                    SET stock = ?
+                    WHERE id = ?
+                    RETURNING id, stock
+                """, (amount, product_id))
+
+            updated = cur.fetchone()
+            if not updated:
+                results.append((name, {"ok": False, "message": "Stok jadi negatif."}))
+                continue
+
+            product_id, new_stock = updated
+            after_commit(functools.partial(product_catalog.set_stock, product_id, new_stock))
+            results.append((name, {"ok": True, "message": f"Stok baru {new_stock}"}))
+    return results
+
+
+def parse_invoice_codes(text: str):
+    codes = []
+    for code in re.findall(r"[A-Za-z0-9-]+", text):
+        code = code.upper()
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+def parse_stock_rows(text: str):
+    # Format per baris: "nama,stok" (koma, titik koma atau tab). Pemisah
+    # ditebak dari baris pertama, jadi nama yang mengandung pemisah lain tetap
+    # utuh. Baris kosong dan header "nama,stok" dilewati; kolom terakhir
+    # selalu dianggap stok.
+    first_line = next((line for line in text.splitlines() if line.strip()), "")
+    try:
+        delimiter = csv.Sniffer().sniff(first_line, delimiters=",;\t").delimiter
+    except csv.Error:
+        delimiter = ","
+
+    rows = []
+    for line in csv.reader(io.StringIO(text), delimiter=delimiter):
+        while line and not line[-1].strip():
+            line.pop()
+        if len(line) < 2:
+            continue
+        name, value = delimiter.join(line[:-1]).strip(), line[-1].replace(" ", "")
+        if name.casefold() == "nama" and value.casefold() == "stok":
+            continue
+        rows.append((name, value))
+    return rows
+
+
+async def run_bulk_payment(interaction: discord.Interaction, member: discord.Member, codes):
+    if not codes or len(codes) > BULK_MAX_ROWS:
+        await interaction.response.send_message(
+            f"❌ Masukkan 1 sampai {BULK_MAX_ROWS} kode invoice.", ephemeral=True
+        )
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    results = await run_db(bulk_confirm_payment, codes, str(member))
+
+    for invoice_code, result in results:
+        if not result["ok"]:
+            continue
+        expiry_scheduler.discard(invoice_code)
+        spawn_background(deliver_dm(
+            int(result["user_id"]),
+            embed=build_payment_dm_embed(invoice_code, result)
+        ))
+        await log_activity(
+            str(member.id), str(member), actor_role(member),
+            "CONFIRM_PAYMENT", "INVOICE", invoice_code,
+            f"Massal; Produk={result['product_name']}, Qty={result['quantity']}, StokSisa={result['new_stock']}"
+        )
+
+    embed = build_bulk_result_embed("Konfirmasi Bayar Massal", results)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+    send_admin_log(content=f"💰 Konfirmasi bayar massal oleh **{member}**", embed=embed)
+
+
+async def run_bulk_cancel(interaction: discord.Interaction, member: discord.Member, codes, notes: str | None):
+    if not codes or len(codes) > BULK_MAX_ROWS:
+        await interaction.response.send_message(
+            f"❌ Masukkan 1 sampai {BULK_MAX_ROWS} kode invoice.", ephemeral=True
+        )
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    results = await run_db(bulk_cancel_invoices, codes, str(member), notes)
+
+    for invoice_code, result in results:
+        if not result["ok"]:
+            continue
+        expiry_scheduler.discard(invoice_code)
+        await log_activity(
+            str(member.id), str(member), actor_role(member),
+            "CANCEL_INVOICE", "INVOICE", invoice_code,
+            f"Massal; {notes or '-'}"
+        )
+
+    embed = build_bulk_result_embed("Batal Invoice Massal", results)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+    send_admin_log(content=f"🗑️ Batal invoice massal oleh **{member}**", embed=embed)
+
+
+async def run_bulk_restock(interaction: discord.Interaction, member: discord.Member, rows):
+    if not rows or len(rows) > BULK_MAX_ROWS:
+        message = f"❌ Masukkan 1 sampai {BULK_MAX_ROWS} baris `nama,stok`."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+        return
+
+    if not interaction.response.is_done():
+        await interaction.response.defer(ephemeral=True, thinking=True)
+    results = await run_db(bulk_set_stock, rows)
+
+    for name, result in results:
+        if result["ok"]:
+            await log_activity(
+                str(member.id), str(member), actor_role(member),
+                "SET_STOCK", "PRODUCT", name,
+                f"Massal; {result['message']}"
+            )
+
+    embed = build_bulk_result_embed("Restok Massal", results)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+    send_admin_log(content=f"📦 Restok massal oleh **{member}**", embed=embed)
 
-    color = discord.Color.orange()
-    if status == "PAID":
-        color = discord.Color.green()
-    elif status == "DONE":
-        color = discord.Color.dark_green()
-    elif status == "PROCESSING":
-        color = discord.Color.blurple()
-    elif status == "CANCELLED":
-        color = discord.Color.red()
-    elif status == "EXPIRED":
-        color = discord.Color.dark_red()
 
-    embed = discord.Embed(title="Detail Invoice", color=color)
-    embed.add_field(name="No. Invoice", value=invoice_code, inline=False)
-    embed.add_field(name="Customer", value=username, inline=False)
-    embed.add_field(name="Produk", value=product_name, inline=False)
-    embed.add_field(name="Qty", value=str(quantity), inline=True)
-    embed.add_field(name="Harga Satuan", value=rupiah(unit_price), inline=True)
-    embed.add_field(name="Total", value=rupiah(total_price), inline=False)
-    embed.add_field(name="Status", value=status, inline=True)
-    embed.add_field(name="Dibuat", value=created_at, inline=True)
-    embed.add_field(name="Batas Bayar", value=due_at, inline=True)
-    embed.add_field(name="Paid At", value=paid_at if paid_at else "-", inline=False)
-    embed.add_field(name="Ditangani Oleh", value=handled_by if handled_by else "-", inline=False)
-    embed.add_field(name="Catatan", value=notes if notes else "-", inline=False)
-    return embed
+def build_bulk_result_embed(title: str, results):
+    ok_count = sum(1 for _key, result in results if result["ok"])
+    embed = discord.Embed(
+        title=title,
+        color=discord.Color.green() if ok_count == len(results) else discord.Color.orange(),
+        timestamp=discord.utils.utcnow()
+    )
 
+    lines = []
+    for key, result in results:
+        icon = "✅" if result["ok"] else "❌"
+        lines.append(f"{icon} `{key}` — {result['message']}")
 
-def update_invoice_status(invoice_code: str, new_status: str, handler: str, notes: str | None = None):
-    conn = get_conn()
-    cur = conn.cursor()
+    description = ""
+    for index, line in enumerate(lines):
+        if len(description) + len(line) > 3800:
+            description += f"\n… dan {len(lines) - index} baris lainnya"
+            break
+        description += line + "\n"
 
-    cur.execute("SELECT status FROM invoices WHERE invoice_code = ?", (invoice_code,))
-    existing = cur.fetchone()
-    if not existing:
-        conn.close()
-        return 0
+    embed.description = description or "Tidak ada baris yang diproses."
+    embed.set_footer(text=f"Berhasil {ok_count} dari {len(results)}")
+    return embed
 
-    paid_at = None
-    if new_status == "PAID":
-        paid_at = now_str()
 
-    if notes is None:
+def expire_due_invoices():
+    now_value = now_str()
+
+    # Satu UPDATE untuk semua invoice yang lewat batas; stok yang direservasi
+    # dikembalikan dan log AUTO_EXPIRE ditulis di transaksi yang sama.
+    with db_transaction() as cur:
         cur.execute("""
-            UPDATE invoices
-            SET status = ?, handled_by = ?, paid_at = COALESCE(?, paid_at)
-            WHERE invoice_code = ?
-        """, (new_status, handler, paid_at, invoice_code))
-    else:
+            SELECT items.product_id, SUM(items.quantity)
+            FROM invoices
+            JOIN invoice_items items ON items.invoice_id = invoices.id
+            WHERE invoices.status IN ('UNPAID', 'PROCESSING')
+              AND invoices.due_at <= ?
+              AND invoices.stock_reserved = 1
+            GROUP BY items.product_id
+        """, (now_value,))
+        release_reserved_stock(cur, cur.fetchall())
+
         cur.execute("""
             UPDATE invoices
-            SET status = ?, handled_by = ?, notes = ?, paid_at = COALESCE(?, paid_at)
-            WHERE invoice_code = ?
-        """, (new_status, handler, notes, paid_at, invoice_code))
+            SET status = 'EXPIRED', stock_reserved = 0
+            WHERE status IN ('UNPAID', 'PROCESSING')
+              AND due_at <= ?
+            RETURNING invoice_code, username, product_name, quantity, total_price
+        """, (now_value,))
+        expired = sorted(cur.fetchall())
+
+        if expired:
+            write_activity_logs(cur, [
+                (
+                    "SYSTEM", "SYSTEM", "SYSTEM",
+                    "AUTO_EXPIRE", "INVOICE", invoice_code,
+                    "Invoice expired otomatis", now_value
+                )
+                for invoice_code, *_rest in expired
+            ])
 
-    changed = cur.rowcount
-    conn.commit()
-    conn.close()
-    return changed
+    return expired
 
 
-def confirm_payment_and_reduce_stock(invoice_code: str, handler: str):
+def get_open_invoice_deadlines():
     conn = get_conn()
     cur = conn.cursor()
-
     cur.execute("""
-        SELECT id, user_id, username, product_id, product_name, quantity, total_price, status
+        SELECT invoice_code, due_at
         FROM invoices
-        WHERE invoice_code = ?
-    """, (invoice_code,))
-    row = cur.fetchone()
+        WHERE status IN ('UNPAID', 'PROCESSING')
+    """)
+    return cur.fetchall()
 
-    if not row:
-        conn.close()
-        return {"ok": False, "message": "Invoice tidak ditemukan."}
 
-    invoice_id, user_id, username, product_id, product_name, quantity, total_price, status = row
+def build_expired_embed(rows):
+    embed = discord.Embed(
+        title="Invoice Expired Otomatis",
+        description=f"⏰ **{len(rows)}** invoice otomatis berubah menjadi **EXPIRED**.",
+        color=discord.Color.dark_red(),
+        timestamp=discord.utils.utcnow()
+    )
 
-    if status in ("PAID", "DONE"):
-        conn.close()
-        return {"ok": False, "message": "Invoice sudah dibayar/diselesaikan."}
+    lines = []
+    length = len(embed.description)
+    for code, username, product_name, qty, total in rows:
+        line = f"`{code}` • {username} • {product_name} x{qty} • {rupiah(total)}"
+        if length + len(line) + 1 > 3800:
+            break
+        lines.append(line)
+        length += len(line) + 1
+
+    embed.description = "\n".join([embed.description, *lines])
+    if len(lines) < len(rows):
+        embed.set_footer(text=f"dan {len(rows) - len(lines)} invoice lainnya")
+    return embed
 
-    if status in ("CANCELLED", "EXPIRED"):
-        conn.close()
-        return {"ok": False, "message": "Invoice sudah tidak aktif."}
 
-    cur.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
-    product = cur.fetchone()
-    if not product:
-        conn.close()
-        return {"ok": False, "message": "Produk tidak ditemukan."}
+# Pencarian full-text lewat invoices_fts / activity_logs_fts. Input user
+# dipecah jadi kata, tiap kata jadi prefix query ("kata"*) dan semuanya
+# harus cocok. Hasil diurutkan bm25 (kolom rank FTS5), dipaging dengan
+# keyset (rank, rowid). Invoice dicari di index utama dan index arsip
+# sekaligus; id invoice tetap sama setelah diarsip, jadi rowid tetap unik.
+def build_fts_query(text: str):
+    return " ".join(f'"{term}"*' for term in re.findall(r"\w+", text))
 
-    stock = product[0]
-    if stock < quantity:
-        conn.close()
-        return {"ok": False, "message": f"Stok tidak cukup. Stok sekarang: {stock}"}
 
-    new_stock = stock - quantity
-    paid_at = now_str()
+def fetch_search_page(cur, sql: str, text: str, limit: int, cursor, backward: bool, table: str,
+                      sources: int = 1):
+    page = fetch_keyset_page(
+        cur, sql, (build_fts_query(text),) * sources, limit, cursor, backward,
+        descending=False, key=f"({table}.rank, {table}.rowid)"
+    )
+    rows = [((row[0], row[1]),) + tuple(row[2:]) for row in page.rows]
+    return Page(rows, page.has_prev, page.has_next)
 
-    try:
-        cur.execute("UPDATE products SET stock = ? WHERE id = ?", (new_stock, product_id))
-        cur.execute("""
-            UPDATE invoices
-            SET status = 'PAID', paid_at = ?, handled_by = ?
-            WHERE id = ?
-        """, (paid_at, handler, invoice_id))
-        conn.commit()
-        conn.close()
 
-        return {
-            "ok": True,
-            "user_id": user_id,
-            "username": username,
-            "product_name": product_name,
-            "quantity": quantity,
-            "total_price": total_price,
-            "new_stock": new_stock
-        }
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return {"ok": False, "message": str(e)}
+def search_invoices(text: str, limit=PAGE_SIZE, cursor=None, backward=False):
+    conn = get_conn()
+    cur = conn.cursor()
+    return fetch_search_page(cur, """
+        SELECT found.rank, found.rowid,
+               found.invoice_code, found.username, found.product_name, found.quantity,
+               found.total_price, found.status, found.created_at, found.notes
+        FROM (
+            SELECT f.rank AS rank, f.rowid AS rowid,
+                   i.invoice_code, i.username, i.product_name, i.quantity,
+                   i.total_price, i.status, i.created_at, i.notes
+            FROM main.invoices_fts f
+            JOIN main.invoices i ON i.id = f.rowid
+            WHERE f.invoices_fts MATCH ?
+            UNION ALL
+            SELECT f.rank, f.rowid,
+                   i.invoice_code, i.username, i.product_name, i.quantity,
+                   i.total_price, i.status, i.created_at, i.notes
+            FROM archive.invoices_fts f
+            JOIN archive.invoices i ON i.id = f.rowid
+            WHERE f.invoices_fts MATCH ?
+        ) AS found
+        WHERE {keyset}
+        ORDER BY found.rank {order}, found.rowid {order}
+        LIMIT ?
+    """, text, limit, cursor, backward, "found", sources=2)
 
 
-def expire_due_invoices():
+def search_logs(text: str, limit=PAGE_SIZE, cursor=None, backward=False):
     conn = get_conn()
     cur = conn.cursor()
-    now_value = now_str()
+    return fetch_search_page(cur, """
+        SELECT activity_logs_fts.rank, activity_logs_fts.rowid,
+               l.actor_name, l.actor_role, l.action_type, l.target_type,
+               l.target_value, l.detail, l.created_at
+        FROM activity_logs_fts
+        JOIN activity_logs l ON l.id = activity_logs_fts.rowid
+        WHERE activity_logs_fts MATCH ? AND {keyset}
+        ORDER BY activity_logs_fts.rank {order}, activity_logs_fts.rowid {order}
+        LIMIT ?
+    """, text, limit, cursor, backward, "activity_logs_fts")
+
+
+def build_invoice_search_embed(text: str, rows):
+    embed = discord.Embed(
+        title=f"Hasil Cari Invoice: {text}"[:256],
+        color=discord.Color.orange(),
+        timestamp=discord.utils.utcnow()
+    )
+
+    if not rows:
+        embed.description = "Tidak ada invoice yang cocok."
+        return embed
+
+    for _key, code, username, product_name, qty, total, status, created_at, notes in rows:
+        value = f"{username}\n{product_name} x{qty}\n{rupiah(total)}\nDibuat: {created_at}"
+        if notes:
+            value = f"{value}\nCatatan: {notes}"
+        embed.add_field(name=f"{code} | {status}", value=value[:1024], inline=False)
+    return embed
 
-    cur.execute("""
-        SELECT invoice_code, user_id
-        FROM invoices
-        WHERE status IN ('UNPAID', 'PROCESSING')
-          AND due_at < ?
-    """, (now_value,))
-    rows = cur.fetchall()
 
-    expired_codes = []
-    for invoice_code, _user_id in rows:
+# Retensi log: baris lebih tua dari LOG_RETENTION_DAYS, atau di luar
+# LOG_MAX_ROWS baris terbaru, dipindah ke archive.activity_logs per batch
+# supaya lock tulis tidak lama. Transaksi lintas database di mode WAL tidak
+# atomik sebagai satu kesatuan, jadi insert ke arsip pakai OR IGNORE: kalau
+# crash di tengah, batch yang sama aman diulang. Tiap batch dijalankan
+# sebagai job run_db sendiri (lihat archive_in_batches).
+def get_log_archive_boundary():
+    cur = get_conn().cursor()
+    cutoff = (now_dt() - timedelta(days=LOG_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM activity_logs WHERE created_at < ?", (cutoff,))
+    boundary = cur.fetchone()[0]
+
+    if LOG_MAX_ROWS > 0:
+        cur.execute("SELECT id FROM activity_logs ORDER BY id DESC LIMIT 1 OFFSET ?", (LOG_MAX_ROWS,))
+        row = cur.fetchone()
+        if row:
+            boundary = max(boundary, row[0])
+    return boundary
+
+
+def archive_log_batch(boundary: int, batch_size=ARCHIVE_BATCH_SIZE):
+    with db_transaction() as cur:
         cur.execute("""
-            UPDATE invoices
-            SET status = 'EXPIRED'
-            WHERE invoice_code = ?
-        """, (invoice_code,))
-        expired_codes.append(invoice_code)
+            INSERT OR IGNORE INTO archive.activity_logs (
+                id, actor_id, actor_name, actor_role, action_type,
+                target_type, target_value, detail, created_at
+            )
+            SELECT id, actor_id, actor_name, actor_role, action_type,
+                   target_type, target_value, detail, created_at
+            FROM main.activity_logs
+            WHERE id <= ?
+            ORDER BY id
+            LIMIT ?
+        """, (boundary, batch_size))
+        cur.execute("""
+            DELETE FROM main.activity_logs
+            WHERE id IN (
+                SELECT id FROM main.activity_logs
+                WHERE id <= ?
+                ORDER BY id
+                LIMIT ?
+            )
+        """, (boundary, batch_size))
+        return cur.rowcount
+
+
+# Invoice DONE/EXPIRED/CANCELLED yang lebih tua dari INVOICE_ARCHIVE_DAYS
+# dipindah ke archive.invoices, jadi tabel utama hanya berisi invoice yang
+# masih aktif atau baru selesai. Detail invoice dan "invoice saya" tetap
+# membaca arsip sebagai fallback.
+INVOICE_ARCHIVE_COLUMNS = """
+    id, invoice_code, user_id, username, product_id, product_name,
+    quantity, unit_price, total_price, status, created_at, due_at,
+    paid_at, notes, handled_by, stock_reserved
+"""
+
+
+def get_invoice_archive_cutoff():
+    return (now_dt() - timedelta(days=INVOICE_ARCHIVE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def archive_invoice_batch(cutoff: str, batch_size=ARCHIVE_BATCH_SIZE):
+    with db_transaction() as cur:
+        cur.execute("""
+            SELECT id FROM main.invoices INDEXED BY idx_invoices_closed_id
+            WHERE status IN ('DONE', 'EXPIRED', 'CANCELLED') AND created_at < ?
+            ORDER BY id
+            LIMIT ?
+        """, (cutoff, batch_size))
+        ids = [row[0] for row in cur.fetchall()]
+        if ids:
+            marks = ", ".join("?" * len(ids))
+            cur.execute(f"""
+                INSERT OR IGNORE INTO archive.invoices ({INVOICE_ARCHIVE_COLUMNS})
+                SELECT {INVOICE_ARCHIVE_COLUMNS} FROM main.invoices
+                WHERE id IN ({marks})
+            """, ids)
+            cur.execute(f"""
+                INSERT OR IGNORE INTO archive.invoice_items (
+                    id, invoice_id, product_id, product_name, quantity, unit_price, total_price
+                )
+                SELECT id, invoice_id, product_id, product_name, quantity, unit_price, total_price
+                FROM main.invoice_items
+                WHERE invoice_id IN ({marks})
+            """, ids)
+            cur.execute(f"DELETE FROM main.invoice_items WHERE invoice_id IN ({marks})", ids)
+            cur.execute(f"DELETE FROM main.invoices WHERE id IN ({marks})", ids)
+    return len(ids)
 
-    conn.commit()
-    conn.close()
-    return expired_codes
+
+def get_archived_logs(target: str | None = None, limit=PAGE_SIZE, cursor=None, backward=False):
+    conn = get_conn()
+    cur = conn.cursor()
+    where, params = ("target_value = ?", (target,)) if target else ("1", ())
+    return fetch_keyset_page(cur, f"""
+        SELECT id, actor_name, actor_role, action_type, target_type, target_value, detail, created_at
+        FROM archive.activity_logs
+        WHERE {where} AND {{keyset}}
+        ORDER BY id {{order}}
+        LIMIT ?
+    """, params, limit, cursor, backward)
 
 
-def get_recent_logs(limit=10):
+def get_recent_logs(limit=PAGE_SIZE, cursor=None, backward=False):
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT actor_name, actor_role, action_type, target_type, target_value, detail, created_at
+    return fetch_keyset_page(cur, """
+        SELECT id, actor_name, actor_role, action_type, target_type, target_value, detail, created_at
         FROM activity_logs
-        ORDER BY id DESC
+        WHERE {keyset}
+        ORDER BY id {order}
         LIMIT ?
-    """, (limit,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    """, (), limit, cursor, backward)
 
 
-def build_logs_embed(limit=10):
-    rows = get_recent_logs(limit)
+def build_logs_embed(rows, title="Aktivitas Terbaru"):
     embed = discord.Embed(
-        title="Aktivitas Terbaru",
+        title=title[:256],
         color=discord.Color.light_grey(),
         timestamp=discord.utils.utcnow()
     )
@@ -457,7 +2380,7 @@ def build_logs_embed(limit=10):
         embed.description = "Belum ada aktivitas."
         return embed
 
-    for actor_name, role_name, action_type, target_type, target_value, detail, created_at in rows:
+    for _key, actor_name, role_name, action_type, target_type, target_value, detail, created_at in rows:
         embed.add_field(
             name=f"{actor_name} [{role_name}]",
             value=f"{action_type} • {target_type}: {target_value}\n{detail or '-'}\n{created_at}",
@@ -475,25 +2398,221 @@ def get_all_products():
         ORDER BY id ASC
     """)
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
-def get_product_by_id(product_id: int):
+# Bot memakai product_catalog; query ini hanya dipertahankan sebagai
+# pembanding di bench.py (get_product_by_name_sql vs product_catalog_find).
+def get_product_by_name(name: str):
     conn = get_conn()
     cur = conn.cursor()
     cur.execute("""
         SELECT id, name, price, stock, description
         FROM products
-        WHERE id = ?
-    """, (product_id,))
+        WHERE name = ? COLLATE NOCASE
+    """, (name,))
     row = cur.fetchone()
-    conn.close()
     return row
 
 
+def create_product(name: str, price: int, stock: int, description: str):
+    with db_transaction() as cur:
+        cur.execute("""
+            INSERT INTO products (name, price, stock, description)
+            VALUES (?, ?, ?, ?)
+            RETURNING id, name, price, stock, description
+        """, (name, price, stock, description))
+        row = cur.fetchone()
+        after_commit(functools.partial(product_catalog.put, row))
+    return row
+
+
+def set_product_stock(name: str, stock: int):
+    with db_transaction() as cur:
+        cur.execute("""
+            UPDATE products
+            SET stock = ?
+            WHERE name = ? COLLATE NOCASE
+            RETURNING id, stock
+        """, (stock, name))
+        rows = cur.fetchall()
+        for product_id, new_stock in rows:
+            after_commit(functools.partial(product_catalog.set_stock, product_id, new_stock))
+    return len(rows)
+
+
+# Satu invoice untuk satu atau beberapa produk (keranjang). items berisi
+# (product_id, quantity); harga diambil dari tabel products di dalam
+# transaksi. Semua baris direservasi atau tidak sama sekali. Kolom produk di
+# invoices berisi ringkasan (produk pertama, "A x2, B x1", total qty) supaya
+# embed, pencarian dan dashboard tetap jalan; rinciannya di invoice_items.
+def create_invoice(user_id: str, username: str, items):
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    invoice_code = generate_invoice_code()
+    created_at = now_str()
+    due_at = (now_dt() + timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        with db_transaction() as cur:
+            lines = []
+            for product_id, quantity in quantities.items():
+                cur.execute("SELECT name, price FROM products WHERE id = ?", (product_id,))
+                product = cur.fetchone()
+                if not product:
+                    raise OrderRejected("Produk sudah tidak tersedia.")
+
+                name, price = product
+                new_stock = reserve_stock(cur, product_id, quantity)
+                if new_stock is None:
+                    cur.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+                    stock = cur.fetchone()[0]
+                    if len(quantities) == 1:
+                        raise OrderRejected(f"Stok tidak cukup. Stok tersedia: **{stock}**")
+                    raise OrderRejected(f"Stok **{name}** tidak cukup. Stok tersedia: **{stock}**")
+                lines.append((product_id, name, quantity, price, new_stock))
+
+            if len(lines) == 1:
+                product_id, product_name, quantity, unit_price, _new_stock = lines[0]
+            else:
+                product_id = lines[0][0]
+                product_name = ", ".join(f"{name} x{quantity}" for _pid, name, quantity, _price, _stock in lines)
+                quantity = sum(line[2] for line in lines)
+                unit_price = 0
+            total_price = sum(line[2] * line[3] for line in lines)
+
+            cur.execute(f"""
+                INSERT INTO invoices (
+                    invoice_code, user_id, username, product_id, product_name,
+                    quantity, unit_price, total_price, status, created_at, due_at,
+                    stock_reserved
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+                RETURNING id, {INVOICE_DETAIL_COLUMNS}
+            """, (
+                invoice_code,
+                user_id,
+                username,
+                product_id,
+                product_name,
+                quantity,
+                unit_price,
+                total_price,
+                "UNPAID",
+                created_at,
+                due_at
+            ))
+            invoice_id, *row = cur.fetchone()
+
+            cur.executemany("""
+                INSERT INTO invoice_items (
+                    invoice_id, product_id, product_name, quantity, unit_price, total_price
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (invoice_id, pid, name, qty, price, qty * price)
+                for pid, name, qty, price, _stock in lines
+            ])
+    except OrderRejected as e:
+        return {"ok": False, "message": str(e)}
+
+    return {
+        "ok": True,
+        "invoice": tuple(row),
+        "items": lines,
+        "new_stock": format_stock_summary([(name, stock) for _pid, name, _qty, _price, stock in lines])
+    }
+
+
+def get_user_invoices(user_id: str, limit=PAGE_SIZE, cursor=None, backward=False):
+    conn = get_conn()
+    cur = conn.cursor()
+    return fetch_keyset_page(cur, """
+        SELECT id, invoice_code, product_name, quantity, total_price, status, due_at
+        FROM (
+            SELECT id, user_id, invoice_code, product_name, quantity, total_price, status, due_at
+            FROM main.invoices
+            UNION ALL
+            SELECT id, user_id, invoice_code, product_name, quantity, total_price, status, due_at
+            FROM archive.invoices
+        )
+        WHERE user_id = ? AND {keyset}
+        ORDER BY id {order}
+        LIMIT ?
+    """, (user_id,), limit, cursor, backward)
+
+
+def build_user_invoices_embed(rows):
+    embed = discord.Embed(
+        title="Invoice Saya",
+        color=discord.Color.blurple()
+    )
+
+    if not rows:
+        embed.description = "Kamu belum punya invoice."
+        return embed
+
+    for _invoice_id, code, product_name, qty, total, status, due_at in rows:
+        embed.add_field(
+            name=f"{code} | {status}",
+            value=f"{product_name} x{qty}\n{rupiah(total)}\nDue: {due_at}",
+            inline=False
+        )
+    return embed
+
+
+def build_product_list_embed(rows):
+    embed = discord.Embed(title="Daftar Produk", color=discord.Color.blue())
+
+    if not rows:
+        embed.description = "Belum ada produk."
+        return embed
+
+    for _product_id, name, price, stock, description in rows:
+        embed.add_field(
+            name=f"{name} | {rupiah(price)}",
+            value=f"Stok: **{stock}**\n{description or '-'}",
+            inline=False
+        )
+    return embed
+
+
+def build_cart_embed(user_id: int):
+    lines = carts.get(user_id)
+
+    embed = discord.Embed(
+        title="Keranjang Saya",
+        color=discord.Color.green(),
+        timestamp=discord.utils.utcnow()
+    )
+
+    if not lines:
+        embed.description = "Keranjang masih kosong. Pilih produk dari dropdown untuk menambah."
+        return embed
+
+    total = 0
+    for product_id, quantity in lines.items():
+        product = product_catalog.get(product_id)
+        if not product:
+            embed.add_field(name="Produk tidak tersedia", value=f"x{quantity}", inline=False)
+            continue
+
+        _product_id, name, price, stock, _description = product
+        total += price * quantity
+        warning = "" if stock >= quantity else f"\n⚠️ Stok tinggal {stock}"
+        embed.add_field(
+            name=f"{name} x{quantity}",
+            value=f"{rupiah(price)} × {quantity} = **{rupiah(price * quantity)}**{warning}",
+            inline=False
+        )
+
+    embed.add_field(name="Total", value=f"**{rupiah(total)}**", inline=False)
+    embed.set_footer(text=f"{len(lines)}/{CartStore.MAX_LINES} produk • stok direservasi saat checkout")
+    return embed
+
+
 def build_member_order_embed():
-    products = get_all_products()
+    products = product_catalog.all()
 
     embed = discord.Embed(
         title="Panel Order Member",
@@ -519,7 +2638,7 @@ def build_member_order_embed():
         )
 
     if len(products) > 10:
-        embed.set_footer(text=f"Menampilkan 10 dari {len(products)} produk")
+        embed.set_footer(text=f"Menampilkan 10 dari {len(products)} produk • klik Semua Produk untuk daftar lengkap")
     else:
         embed.set_footer(text="Pilih produk dari dropdown untuk order")
 
@@ -529,7 +2648,7 @@ def build_member_order_embed():
 # =========================================================
 # MODALS
 # =========================================================
-class AddProductModal(discord.ui.Modal, title="Tambah Produk"):
+class AddProductModal(StoreModal, title="Tambah Produk"):
     nama = discord.ui.TextInput(label="Nama Produk", max_length=100)
     harga = discord.ui.TextInput(label="Harga", placeholder="50000")
     stok = discord.ui.TextInput(label="Stok", placeholder="10")
@@ -549,16 +2668,9 @@ class AddProductModal(discord.ui.Modal, title="Tambah Produk"):
             return
 
         try:
-            conn = get_conn()
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO products (name, price, stock, description)
-                VALUES (?, ?, ?, ?)
-            """, (str(self.nama), harga_int, stok_int, str(self.deskripsi)))
-            conn.commit()
-            conn.close()
+            await run_db(create_product, str(self.nama), harga_int, stok_int, str(self.deskripsi))
 
-            log_activity(
+            await log_activity(
                 str(member.id), str(member), actor_role(member),
                 "ADD_PRODUCT", "PRODUCT", str(self.nama),
                 f"Harga={harga_int}, Stok={stok_int}"
@@ -572,7 +2684,7 @@ class AddProductModal(discord.ui.Modal, title="Tambah Produk"):
             await interaction.response.send_message("❌ Nama produk sudah ada.", ephemeral=True)
 
 
-class SetStockModal(discord.ui.Modal, title="Ubah Stok"):
+class SetStockModal(StoreModal, title="Ubah Stok"):
     nama = discord.ui.TextInput(label="Nama Produk")
     stok = discord.ui.TextInput(label="Stok Baru", placeholder="25")
 
@@ -588,18 +2700,13 @@ class SetStockModal(discord.ui.Modal, title="Ubah Stok"):
             await interaction.response.send_message("Stok harus angka.", ephemeral=True)
             return
 
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("UPDATE products SET stock = ? WHERE LOWER(name)=LOWER(?)", (stok_int, str(self.nama)))
-        conn.commit()
-        changed = cur.rowcount
-        conn.close()
+        changed = await run_db(set_product_stock, str(self.nama), stok_int)
 
         if changed == 0:
             await interaction.response.send_message("❌ Produk tidak ditemukan.", ephemeral=True)
             return
 
-        log_activity(
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             "SET_STOCK", "PRODUCT", str(self.nama),
             f"Stok baru={stok_int}"
@@ -611,7 +2718,7 @@ class SetStockModal(discord.ui.Modal, title="Ubah Stok"):
         )
 
 
-class InvoiceLookupModal(discord.ui.Modal, title="Cek Detail Invoice"):
+class InvoiceLookupModal(StoreModal, title="Cek Detail Invoice"):
     invoice_code = discord.ui.TextInput(label="Kode Invoice", placeholder="INV-20260228-ABC123")
 
     async def on_submit(self, interaction: discord.Interaction):
@@ -620,12 +2727,12 @@ class InvoiceLookupModal(discord.ui.Modal, title="Cek Detail Invoice"):
             await interaction.response.send_message("Kamu tidak punya akses helper/admin.", ephemeral=True)
             return
 
-        row = get_invoice_detail(str(self.invoice_code))
+        row = await run_db(get_invoice_detail, str(self.invoice_code))
         if not row:
             await interaction.response.send_message("❌ Invoice tidak ditemukan.", ephemeral=True)
             return
 
-        log_activity(
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             "LOOKUP_INVOICE", "INVOICE", str(self.invoice_code),
             "Melihat detail invoice"
@@ -634,7 +2741,7 @@ class InvoiceLookupModal(discord.ui.Modal, title="Cek Detail Invoice"):
         await interaction.response.send_message(embed=build_invoice_embed(row), ephemeral=True)
 
 
-class InvoiceActionModal(discord.ui.Modal):
+class InvoiceActionModal(StoreModal):
     def __init__(self, title_text: str, target_status: str):
         super().__init__(title=title_text)
         self.target_status = target_status
@@ -649,7 +2756,8 @@ class InvoiceActionModal(discord.ui.Modal):
             await interaction.response.send_message("Kamu tidak punya akses helper/admin.", ephemeral=True)
             return
 
-        changed = update_invoice_status(
+        changed = await run_db(
+            update_invoice_status,
             invoice_code=str(self.invoice_code),
             new_status=self.target_status,
             handler=str(member),
@@ -660,7 +2768,16 @@ class InvoiceActionModal(discord.ui.Modal):
             await interaction.response.send_message("❌ Invoice tidak ditemukan.", ephemeral=True)
             return
 
-        log_activity(
+        if self.target_status in OPEN_INVOICE_STATUSES:
+            # Invoice yang dibuka lagi (mis. dari EXPIRED) harus kembali masuk
+            # jadwal expire, kalau tidak ia tetap terbuka lewat deadline.
+            row = await run_db(get_invoice_detail, str(self.invoice_code))
+            if row:
+                expiry_scheduler.schedule(str(self.invoice_code), row[8])
+        else:
+            expiry_scheduler.discard(str(self.invoice_code))
+
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             f"SET_{self.target_status}", "INVOICE", str(self.invoice_code),
             str(self.note) if str(self.note).strip() else "-"
@@ -672,7 +2789,7 @@ class InvoiceActionModal(discord.ui.Modal):
         )
 
 
-class PayInvoiceModal(discord.ui.Modal, title="Konfirmasi Pembayaran"):
+class PayInvoiceModal(StoreModal, title="Konfirmasi Pembayaran"):
     invoice_code = discord.ui.TextInput(label="Kode Invoice", placeholder="INV-20260228-ABC123")
 
     async def on_submit(self, interaction: discord.Interaction):
@@ -681,51 +2798,51 @@ class PayInvoiceModal(discord.ui.Modal, title="Konfirmasi Pembayaran"):
             await interaction.response.send_message("Kamu tidak punya akses helper/admin.", ephemeral=True)
             return
 
-        result = confirm_payment_and_reduce_stock(str(self.invoice_code), str(member))
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        result = await run_db(confirm_payment_and_reduce_stock, str(self.invoice_code), str(member))
         if not result["ok"]:
-            await interaction.response.send_message(f"❌ {result['message']}", ephemeral=True)
+            await interaction.followup.send(f"❌ {result['message']}", ephemeral=True)
             return
 
-        log_activity(
-            str(member.id), str(member), actor_role(member),
-            "CONFIRM_PAYMENT", "INVOICE", str(self.invoice_code),
-            f"Produk={result['product_name']}, Qty={result['quantity']}, StokSisa={result['new_stock']}"
-        )
+        expiry_scheduler.discard(str(self.invoice_code))
 
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"✅ Invoice **{self.invoice_code}** berhasil dikonfirmasi **PAID**.\n"
             f"Stok baru: **{result['new_stock']}**",
             ephemeral=True
         )
 
-        try:
-            user = await bot.fetch_user(int(result["user_id"]))
-            dm_embed = discord.Embed(title="Pembayaran Diterima", color=discord.Color.green())
-            dm_embed.add_field(name="Invoice", value=str(self.invoice_code), inline=False)
-            dm_embed.add_field(name="Produk", value=result["product_name"], inline=False)
-            dm_embed.add_field(name="Qty", value=str(result["quantity"]), inline=True)
-            dm_embed.add_field(name="Total", value=rupiah(result["total_price"]), inline=True)
-            dm_embed.add_field(name="Status", value="PAID", inline=True)
-            await user.send(embed=dm_embed)
-        except Exception:
-            pass
+        spawn_background(deliver_dm(
+            int(result["user_id"]),
+            interaction=interaction,
+            fallback="⚠️ DM konfirmasi ke customer gagal dikirim.",
+            embed=build_payment_dm_embed(str(self.invoice_code), result)
+        ))
+
+        await log_activity(
+            str(member.id), str(member), actor_role(member),
+            "CONFIRM_PAYMENT", "INVOICE", str(self.invoice_code),
+            f"Produk={result['product_name']}, Qty={result['quantity']}, StokSisa={result['new_stock']}"
+        )
 
-        await send_admin_log(
+        send_admin_log(
             content=f"💰 Invoice **{self.invoice_code}** dikonfirmasi PAID oleh **{member}**"
         )
 
 
-class CancelInvoiceModal(discord.ui.Modal, title="Batalkan Invoice"):
+class CancelInvoiceModal(StoreModal, title="Batalkan Invoice"):
     invoice_code = discord.ui.TextInput(label="Kode Invoice", placeholder="INV-20260228-ABC123")
     note = discord.ui.TextInput(label="Alasan Cancel", required=False, style=discord.TextStyle.paragraph)
 
-async def on_submit(self, interaction: discord.Interaction):
+    async def on_submit(self, interaction: discord.Interaction):
         member = interaction.user
         if not isinstance(member, discord.Member) or not is_admin_member(member):
             await interaction.response.send_message("Kamu tidak punya akses admin.", ephemeral=True)
             return
 
-        changed = update_invoice_status(
+        changed = await run_db(
+            update_invoice_status,
             invoice_code=str(self.invoice_code),
             new_status="CANCELLED",
             handler=str(member),
@@ -736,25 +2853,69 @@ async def on_submit(self, interaction: discord.Interaction):
             await interaction.response.send_message("❌ Invoice tidak ditemukan.", ephemeral=True)
             return
 
-        log_activity(
+        expiry_scheduler.discard(str(self.invoice_code))
+
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             "CANCEL_INVOICE", "INVOICE", str(self.invoice_code),
             str(self.note) if str(self.note).strip() else "-"
         )
 
-        await interaction.response.send_message(
-            f"✅ Invoice **{self.invoice_code}** dibatalkan.",
-            ephemeral=True
-        )
+        await interaction.response.send_message(
+            f"✅ Invoice **{self.invoice_code}** dibatalkan.",
+            ephemeral=True
+        )
+
+
+class BulkStockModal(StoreModal, title="Restok Massal"):
+    baris = discord.ui.TextInput(
+        label="Satu produk per baris: nama,stok",
+        placeholder="Robux 400,50\nGamepass VIP,+10",
+        style=discord.TextStyle.paragraph,
+        max_length=4000
+    )
+
+    async def on_submit(self, interaction: discord.Interaction):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_admin_member(member):
+            await interaction.response.send_message("Kamu tidak punya akses admin.", ephemeral=True)
+            return
+        await run_bulk_restock(interaction, member, parse_stock_rows(str(self.baris)))
+
+
+class BulkInvoiceModal(StoreModal):
+    def __init__(self, title_text: str, target_status: str):
+        super().__init__(title=title_text)
+        self.target_status = target_status
+        self.codes = discord.ui.TextInput(
+            label="Kode invoice (pisahkan baris/spasi/koma)",
+            placeholder="INV-20260228-ABC123\nINV-20260228-ABC124",
+            style=discord.TextStyle.paragraph,
+            max_length=4000
+        )
+        self.add_item(self.codes)
+        if target_status == "CANCELLED":
+            self.note = discord.ui.TextInput(label="Alasan Cancel", required=False, style=discord.TextStyle.paragraph)
+            self.add_item(self.note)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_admin_member(member):
+            await interaction.response.send_message("Kamu tidak punya akses admin.", ephemeral=True)
+            return
+
+        codes = parse_invoice_codes(str(self.codes))
+        if self.target_status == "PAID":
+            await run_bulk_payment(interaction, member, codes)
+        else:
+            note = str(self.note).strip() or None
+            await run_bulk_cancel(interaction, member, codes, note)
 
 
-class MemberOrderModal(discord.ui.Modal):
-    def __init__(self, product_id: int, product_name: str, unit_price: int, stock_value: int):
-        super().__init__(title=f"Order: {product_name}")
+class MemberOrderModal(StoreModal):
+    def __init__(self, product_id: int, product_name: str, stock_value: int):
+        super().__init__(title=f"Order: {product_name}"[:45])
         self.product_id = product_id
-        self.product_name = product_name
-        self.unit_price = unit_price
-        self.stock_value = stock_value
 
         self.quantity = discord.ui.TextInput(
             label="Jumlah Order",
@@ -775,98 +2936,109 @@ class MemberOrderModal(discord.ui.Modal):
             await interaction.response.send_message("❌ Jumlah harus lebih dari 0.", ephemeral=True)
             return
 
-        latest_product = get_product_by_id(self.product_id)
+        latest_product = product_catalog.get(self.product_id)
         if not latest_product:
             await interaction.response.send_message("❌ Produk sudah tidak tersedia.", ephemeral=True)
             return
 
-        product_id, product_name, unit_price, stock_value, _description = latest_product
+        product_id, product_name, _unit_price, _stock_value, _description = latest_product
 
-        if stock_value < qty:
-            await interaction.response.send_message(
-                f"❌ Stok tidak cukup. Stok tersedia: **{stock_value}**",
-                ephemeral=True
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        try:
+            result = await run_db(
+                create_invoice,
+                str(interaction.user.id), str(interaction.user),
+                [(product_id, qty)]
             )
+        except Exception as e:
+            await interaction.followup.send(f"❌ Gagal membuat order: {e}", ephemeral=True)
             return
 
-        invoice_code = generate_invoice_code()
-        total_price = unit_price * qty
-        created_at = now_str()
-        due_at = (now_dt() + timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
+        if not result["ok"]:
+            await interaction.followup.send(f"❌ {result['message']}", ephemeral=True)
+            return
 
-        conn = get_conn()
-        cur = conn.cursor()
+        row = result["invoice"]
+        invoice_code = row[0]
+        expiry_scheduler.schedule(invoice_code, row[8])
+        embed = build_invoice_embed(row)
 
-        try:
-            cur.execute("""
-                INSERT INTO invoices (
-                    invoice_code, user_id, username, product_id, product_name,
-                    quantity, unit_price, total_price, status, created_at, due_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                invoice_code,
-                str(interaction.user.id),
-                str(interaction.user),
-                product_id,
-                product_name,
-                qty,
-                unit_price,
-                total_price,
-                "UNPAID",
-                created_at,
-                due_at
-            ))
-            conn.commit()
-            conn.close()
+        await interaction.followup.send(
+            f"✅ Order berhasil dibuat.\nInvoice: **{invoice_code}**\nCek DM untuk detail invoice.",
+            ephemeral=True
+        )
 
-            row = get_invoice_detail(invoice_code)
-            embed = build_invoice_embed(row)
+        spawn_background(deliver_dm(
+            interaction.user,
+            interaction=interaction,
+            fallback="⚠️ Aku tidak bisa kirim DM. Aktifkan DM server ya.",
+            content="Berikut invoice pesanan kamu:",
+            embed=embed
+        ))
 
-            log_activity(
-                str(interaction.user.id), str(interaction.user), "USER",
-                "CREATE_ORDER_PANEL", "INVOICE", invoice_code,
-                f"{product_name} x{qty}"
-            )
+        await log_activity(
+            str(interaction.user.id), str(interaction.user), "USER",
+            "CREATE_ORDER_PANEL", "INVOICE", invoice_code,
+            f"{product_name} x{qty}"
+        )
 
-            await interaction.response.send_message(
-                f"✅ Order berhasil dibuat.\nInvoice: **{invoice_code}**\nCek DM untuk detail invoice.",
-                ephemeral=True
-            )
+        send_admin_log(
+            content=f"🛒 Order baru dari {interaction.user.mention} via panel member",
+            embed=embed
+        )
 
-            try:
-                await interaction.user.send(
-                    content="Berikut invoice pesanan kamu:",
-                    embed=embed
-                )
-            except Exception:
-                await interaction.followup.send(
-                    "⚠️ Aku tidak bisa kirim DM. Aktifkan DM server ya.",
-                    ephemeral=True
-                )
 
-            await send_admin_log(
-                content=f"🛒 Order baru dari {interaction.user.mention} via panel member",
-                embed=embed
-            )
+class CartQuantityModal(StoreModal):
+    def __init__(self, product_id: int, product_name: str, stock_value: int, cart_view):
+        super().__init__(title=f"Keranjang: {product_name}"[:45])
+        self.product_id = product_id
+        self.cart_view = cart_view
 
-        except Exception as e:
-            conn.rollback()
-            conn.close()
+        self.quantity = discord.ui.TextInput(
+            label="Jumlah",
+            placeholder=f"Maksimal {stock_value}",
+            required=True,
+            max_length=5
+        )
+        self.add_item(self.quantity)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            qty = int(str(self.quantity))
+        except ValueError:
+            await interaction.response.send_message("❌ Jumlah harus berupa angka.", ephemeral=True)
+            return
+
+        if qty <= 0:
+            await interaction.response.send_message("❌ Jumlah harus lebih dari 0.", ephemeral=True)
+            return
+
+        if not carts.add(interaction.user.id, self.product_id, qty):
             await interaction.response.send_message(
-                f"❌ Gagal membuat order: {e}",
+                f"❌ Keranjang maksimal {CartStore.MAX_LINES} produk.",
                 ephemeral=True
             )
+            return
+
+        self.cart_view.update_items()
+        await interaction.response.edit_message(
+            embed=build_cart_embed(interaction.user.id),
+            view=self.cart_view
+        )
+
 
 # =========================================================
 # SELECTS
 # =========================================================
 class ProductSelect(discord.ui.Select):
-    def __init__(self):
-        products = get_all_products()
+    def __init__(self, products=None, custom_id="member_product_select"):
+        if products is None:
+            products = product_catalog.page(25).rows
 
         options = []
         if products:
-            for product_id, name, price, stock, description in products[:25]:
+            for product_id, name, price, stock, description in products:
                 desc = f"Harga {rupiah(price)} | Stok {stock}"
                 if description:
                     desc = f"{desc} | {description[:40]}"
@@ -891,7 +3063,7 @@ class ProductSelect(discord.ui.Select):
             min_values=1,
             max_values=1,
             options=options,
-            custom_id="member_product_select"
+            custom_id=custom_id
         )
 
     async def callback(self, interaction: discord.Interaction):
@@ -903,7 +3075,7 @@ class ProductSelect(discord.ui.Select):
             return
 
         product_id = int(self.values[0])
-        product = get_product_by_id(product_id)
+        product = product_catalog.get(product_id)
 
         if not product:
             await interaction.response.send_message(
@@ -912,7 +3084,7 @@ class ProductSelect(discord.ui.Select):
             )
             return
 
-        product_id, name, price, stock, _description = product
+        product_id, name, _price, stock, _description = product
 
         if stock <= 0:
             await interaction.response.send_message(
@@ -925,16 +3097,70 @@ class ProductSelect(discord.ui.Select):
             MemberOrderModal(
                 product_id=product_id,
                 product_name=name,
-                unit_price=price,
                 stock_value=stock
             )
         )
 
 
+class CartProductSelect(discord.ui.Select):
+    def __init__(self, products):
+        options = [
+            discord.SelectOption(
+                label=name[:100],
+                value=str(product_id),
+                description=f"Harga {rupiah(price)} | Stok {stock}"[:100]
+            )
+            for product_id, name, price, stock, _description in products
+        ] or [discord.SelectOption(label="Belum ada produk", value="0")]
+
+        super().__init__(
+            placeholder="Tambah produk ke keranjang",
+            min_values=1,
+            max_values=1,
+            options=options,
+            row=0
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        product = product_catalog.get(int(self.values[0]))
+        if not product:
+            await interaction.response.send_message("❌ Produk tidak ditemukan.", ephemeral=True)
+            return
+
+        product_id, name, _price, stock, _description = product
+        if stock <= 0:
+            await interaction.response.send_message(f"❌ Produk **{name}** sedang habis.", ephemeral=True)
+            return
+
+        await interaction.response.send_modal(CartQuantityModal(product_id, name, stock, self.view))
+
+
+class CartRemoveSelect(discord.ui.Select):
+    def __init__(self, lines):
+        options = []
+        for product_id, quantity in lines.items():
+            product = product_catalog.get(product_id)
+            name = product[1] if product else f"Produk #{product_id}"
+            options.append(discord.SelectOption(label=f"{name} x{quantity}"[:100], value=str(product_id)))
+
+        super().__init__(
+            placeholder="Hapus produk dari keranjang",
+            min_values=1,
+            max_values=1,
+            options=options,
+            row=1
+        )
+
+    async def callback(self, interaction: discord.Interaction):
+        carts.remove(interaction.user.id, int(self.values[0]))
+        self.view.update_items()
+        await interaction.response.edit_message(embed=build_cart_embed(interaction.user.id), view=self.view)
+
+
 # =========================================================
 # VIEWS
 # =========================================================
-class AdminPanelView(discord.ui.View):
+class AdminPanelView(StoreView):
     def __init__(self):
         super().__init__(timeout=None)
 
@@ -944,7 +3170,8 @@ class AdminPanelView(discord.ui.View):
         if not isinstance(member, discord.Member) or not is_admin_member(member):
             await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
             return
-        await interaction.response.send_message(embed=build_dashboard_embed(), ephemeral=True)
+        data = await run_db(get_dashboard_data)
+        await interaction.response.send_message(embed=build_dashboard_embed(data), ephemeral=True)
 
     @discord.ui.button(label="Tambah Produk", style=discord.ButtonStyle.success, custom_id="admin_add_product")
     async def add_product(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -968,7 +3195,11 @@ class AdminPanelView(discord.ui.View):
         if not isinstance(member, discord.Member) or not is_admin_member(member):
             await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
             return
-        await interaction.response.send_message(embed=build_pending_embed(), ephemeral=True)
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, get_pending_invoices, PAGE_SIZE),
+            build_pending_embed
+        )
 
     @discord.ui.button(label="Konfirmasi Bayar", style=discord.ButtonStyle.success, custom_id="admin_pay")
     async def pay(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -992,7 +3223,39 @@ class AdminPanelView(discord.ui.View):
         if not isinstance(member, discord.Member) or not is_admin_member(member):
             await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
             return
-        await interaction.response.send_message(embed=build_logs_embed(), ephemeral=True)
+        # Flush bisa menunggu batch yang sedang ditulis/diulang; defer dulu
+        # supaya tidak lewat batas 3 detik acknowledge Discord.
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        await activity_log_writer.flush()
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, get_recent_logs, PAGE_SIZE),
+            build_logs_embed
+        )
+
+    @discord.ui.button(label="Restok Massal", style=discord.ButtonStyle.secondary, custom_id="admin_bulk_stock")
+    async def bulk_stock(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_admin_member(member):
+            await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(BulkStockModal())
+
+    @discord.ui.button(label="Bayar Massal", style=discord.ButtonStyle.success, custom_id="admin_bulk_pay")
+    async def bulk_pay(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_admin_member(member):
+            await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(BulkInvoiceModal("Konfirmasi Bayar Massal", "PAID"))
+
+    @discord.ui.button(label="Batal Massal", style=discord.ButtonStyle.danger, custom_id="admin_bulk_cancel")
+    async def bulk_cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_admin_member(member):
+            await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(BulkInvoiceModal("Batal Invoice Massal", "CANCELLED"))
 
     @discord.ui.button(label="Refresh", style=discord.ButtonStyle.primary, custom_id="admin_refresh")
     async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1000,14 +3263,15 @@ class AdminPanelView(discord.ui.View):
         if not isinstance(member, discord.Member) or not is_admin_member(member):
             await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
             return
+        data = await run_db(get_dashboard_data)
         await interaction.response.send_message(
             content="✅ Data terbaru:",
-            embed=build_dashboard_embed(),
+            embed=build_dashboard_embed(data),
             ephemeral=True
         )
 
 
-class HelperPanelView(discord.ui.View):
+class HelperPanelView(StoreView):
     def __init__(self):
         super().__init__(timeout=None)
 
@@ -1018,125 +3282,757 @@ class HelperPanelView(discord.ui.View):
             await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
             return
 
-        log_activity(
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             "VIEW_PENDING", "INVOICE", "PENDING_LIST",
             "Melihat invoice pending"
         )
 
-        await interaction.response.send_message(embed=build_pending_embed(), ephemeral=True)
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, get_pending_invoices, PAGE_SIZE),
+            build_pending_embed
+        )
+
+    @discord.ui.button(label="Cek Detail", style=discord.ButtonStyle.primary, custom_id="helper_lookup")
+    async def lookup(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_helper_member(member):
+            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(InvoiceLookupModal())
+
+    @discord.ui.button(label="Diproses", style=discord.ButtonStyle.secondary, custom_id="helper_processing")
+    async def processing(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_helper_member(member):
+            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(InvoiceActionModal("Tandai Diproses", "PROCESSING"))
+
+    @discord.ui.button(label="Selesai", style=discord.ButtonStyle.success, custom_id="helper_done")
+    async def done(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_helper_member(member):
+            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(InvoiceActionModal("Tandai Selesai", "DONE"))
+
+    @discord.ui.button(label="Konfirmasi Bayar", style=discord.ButtonStyle.success, custom_id="helper_pay")
+    async def pay(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_helper_member(member):
+            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+            return
+        await interaction.response.send_modal(PayInvoiceModal())
+
+    @discord.ui.button(label="Refresh", style=discord.ButtonStyle.primary, custom_id="helper_refresh")
+    async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
+        member = interaction.user
+        if not isinstance(member, discord.Member) or not is_helper_member(member):
+            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+            return
+
+        await log_activity(
+            str(member.id), str(member), actor_role(member),
+            "REFRESH_PANEL", "PANEL", "HELPER_PANEL",
+            "Refresh helper panel"
+        )
+
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, get_pending_invoices, PAGE_SIZE),
+            build_pending_embed
+        )
+
+
+class MemberOrderPanelView(StoreView):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(ProductSelect())
+
+    @discord.ui.button(label="Refresh Produk", style=discord.ButtonStyle.primary, custom_id="member_refresh_products")
+    async def refresh_products(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_message(
+            embed=build_member_order_embed(),
+            view=MemberOrderPanelView(),
+            ephemeral=True
+        )
+
+    @discord.ui.button(label="Semua Produk", style=discord.ButtonStyle.secondary, custom_id="member_all_products")
+    async def all_products(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await ProductPageView.send(interaction, fetch_product_page, build_product_list_embed)
+
+    @discord.ui.button(label="Keranjang", style=discord.ButtonStyle.success, custom_id="member_cart")
+    async def cart(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_message(
+            embed=build_cart_embed(interaction.user.id),
+            view=CartView(interaction.user.id),
+            ephemeral=True
+        )
+
+    @discord.ui.button(label="Lihat Pending Invoice Saya", style=discord.ButtonStyle.secondary, custom_id="member_my_invoices")
+    async def my_invoices(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, get_user_invoices, str(interaction.user.id), PAGE_SIZE),
+            build_user_invoices_embed
+        )
+
+
+# Keranjang member (pesan ephemeral). Dropdown produk menampilkan 25 produk
+# per halaman katalog; "Produk lain" pindah ke halaman berikutnya. Checkout
+# membuat satu invoice untuk semua isi keranjang.
+class CartView(StoreView):
+    def __init__(self, user_id: int):
+        super().__init__(timeout=600)
+        self.user_id = user_id
+        self.products = product_catalog.page(25)
+        self.update_items()
+
+    def update_items(self):
+        for item in list(self.children):
+            if isinstance(item, discord.ui.Select):
+                self.remove_item(item)
+
+        lines = carts.get(self.user_id)
+        self.add_item(CartProductSelect(self.products.rows))
+        if lines:
+            self.add_item(CartRemoveSelect(lines))
+
+        self.next_products.disabled = not (self.products.has_next or self.products.has_prev)
+        self.checkout.disabled = not lines
+        self.clear_cart.disabled = not lines
+
+    @discord.ui.button(label="Produk lain", style=discord.ButtonStyle.secondary, row=2)
+    async def next_products(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.products.has_next:
+            self.products = product_catalog.page(25, self.products.rows[-1][0])
+        else:
+            self.products = product_catalog.page(25)
+        self.update_items()
+        await interaction.response.edit_message(view=self)
+
+    @discord.ui.button(label="Checkout", style=discord.ButtonStyle.success, row=2)
+    async def checkout(self, interaction: discord.Interaction, button: discord.ui.Button):
+        lines = carts.get(interaction.user.id)
+        if not lines:
+            await interaction.response.send_message("Keranjang masih kosong.", ephemeral=True)
+            return
+
+        await interaction.response.defer()
+
+        try:
+            result = await run_db(
+                create_invoice,
+                str(interaction.user.id), str(interaction.user),
+                list(lines.items())
+            )
+        except Exception as e:
+            await interaction.followup.send(f"❌ Gagal checkout: {e}", ephemeral=True)
+            return
+
+        if not result["ok"]:
+            await interaction.followup.send(f"❌ {result['message']}", ephemeral=True)
+            return
+
+        carts.clear(interaction.user.id)
+        row = result["invoice"]
+        invoice_code = row[0]
+        expiry_scheduler.schedule(invoice_code, row[8])
+        embed = build_invoice_embed(row)
+
+        await interaction.edit_original_response(
+            content=f"✅ Checkout berhasil.\nInvoice: **{invoice_code}**\nCek DM untuk detail invoice.",
+            embed=embed,
+            view=None
+        )
+
+        spawn_background(deliver_dm(
+            interaction.user,
+            interaction=interaction,
+            fallback="⚠️ Aku tidak bisa kirim DM. Aktifkan DM server ya.",
+            content="Berikut invoice pesanan kamu:",
+            embed=embed
+        ))
+
+        await log_activity(
+            str(interaction.user.id), str(interaction.user), "USER",
+            "CREATE_ORDER_CART", "INVOICE", invoice_code,
+            row[2]
+        )
+
+        send_admin_log(
+            content=f"🛒 Order keranjang dari {interaction.user.mention} ({len(result['items'])} produk)",
+            embed=embed
+        )
+
+    @discord.ui.button(label="Kosongkan", style=discord.ButtonStyle.danger, row=2)
+    async def clear_cart(self, interaction: discord.Interaction, button: discord.ui.Button):
+        carts.clear(interaction.user.id)
+        self.update_items()
+        await interaction.response.edit_message(embed=build_cart_embed(interaction.user.id), view=self)
+
+
+# Navigasi halaman untuk daftar panjang. fetch(cursor=..., backward=...)
+# mengembalikan Page; cursor diambil dari kolom pertama (id atau key
+# keyset) baris pertama/terakhir halaman yang sedang tampil, jadi tidak ada
+# OFFSET.
+class PaginatedView(StoreView):
+    def __init__(self, fetch, build_embed, page):
+        super().__init__(timeout=300)
+        self.fetch = fetch
+        self.build_embed = build_embed
+        self.page = page
+        self.page_number = 1
+        self.update_items()
+
+    @classmethod
+    async def send(cls, interaction: discord.Interaction, fetch, build_embed):
+        view = cls(fetch, build_embed, await fetch())
+        kwargs = {"view": view} if view.needed() else {}
+        # Pemanggil yang sudah defer (mis. menunggu flush log) dijawab lewat followup.
+        if interaction.response.is_done():
+            await interaction.followup.send(embed=view.render(), ephemeral=True, **kwargs)
+        else:
+            await interaction.response.send_message(embed=view.render(), ephemeral=True, **kwargs)
+
+    def needed(self):
+        return self.page.has_prev or self.page.has_next
+
+    def update_items(self):
+        self.prev_page.disabled = not self.page.has_prev
+        self.next_page.disabled = not self.page.has_next
+
+    def render(self):
+        embed = self.build_embed(self.page.rows)
+        if self.needed():
+            embed.set_footer(text=f"Halaman {self.page_number}")
+        return embed
+
+    async def turn(self, interaction: discord.Interaction, backward: bool):
+        row = self.page.rows[0] if backward else self.page.rows[-1]
+        page = await self.fetch(cursor=row[0], backward=backward)
+
+        if not page.rows:
+            # Baris di arah itu sudah hilang (mis. invoice pending sudah dibayar).
+            if backward:
+                self.prev_page.disabled = True
+            else:
+                self.next_page.disabled = True
+            await interaction.response.edit_message(view=self)
+            return
+
+        self.page = page
+        self.page_number = 1 if not page.has_prev else max(1, self.page_number + (-1 if backward else 1))
+        self.update_items()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="◀ Sebelumnya", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, backward=True)
+
+    @discord.ui.button(label="Berikutnya ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.turn(interaction, backward=False)
+
+
+# Daftar produk lengkap untuk member: tiap halaman punya dropdown sendiri,
+# jadi produk di luar 25 pertama tetap bisa dipesan.
+class ProductPageView(PaginatedView):
+    def needed(self):
+        return bool(self.page.rows)
+
+    def update_items(self):
+        super().update_items()
+        for item in list(self.children):
+            if isinstance(item, ProductSelect):
+                self.remove_item(item)
+        if self.page.rows:
+            self.add_item(ProductSelect(self.page.rows, custom_id=discord.utils.MISSING))
+
+
+async def fetch_product_page(cursor=None, backward=False):
+    return product_catalog.page(PAGE_SIZE, cursor, backward)
+
+
+# =========================================================
+# TASKS
+# =========================================================
+# Min-heap deadline invoice UNPAID/PROCESSING. Task hanya bangun saat
+# deadline terdekat tiba (atau ada invoice baru dengan deadline lebih awal),
+# jadi tidak ada scan berkala. Invoice yang dibayar/dibatalkan cukup
+# di-discard; entry lamanya di heap dilewati saat keluar.
+class InvoiceExpiryScheduler:
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, invoice_code: str, due_at: str):
+        due = parse_dt(due_at)
+        self._deadlines[invoice_code] = due
+        heapq.heappush(self._heap, (due, invoice_code))
+        if self._heap[0][1] == invoice_code:
+            self._wakeup.set()
+
+    def discard(self, invoice_code: str):
+        self._deadlines.pop(invoice_code, None)
+
+    def load(self, rows):
+        self._deadlines = {}
+        for invoice_code, due_at in rows:
+            self._deadlines[invoice_code] = parse_dt(due_at)
+        self._heap = [(due, code) for code, due in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def next_deadline(self):
+        while self._heap:
+            due, invoice_code = self._heap[0]
+            if self._deadlines.get(invoice_code) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime):
+        due_codes = []
+        while self._heap and self._heap[0][0] <= now:
+            due, invoice_code = heapq.heappop(self._heap)
+            if self._deadlines.get(invoice_code) == due:
+                del self._deadlines[invoice_code]
+                due_codes.append(invoice_code)
+        return due_codes
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.is_running():
+            self._task = asyncio.create_task(self._run(), name="invoice-expiry-scheduler")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            due = self.next_deadline()
+            if due is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = (due - now_dt()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due_codes = self.pop_due(now_dt())
+            if not due_codes:
+                continue
+
+            try:
+                with track_task("expire_invoices"):
+                    expired = await run_db(expire_due_invoices)
+            except Exception:
+                log.exception("Gagal menjalankan expire invoice, dicoba lagi 30 detik lagi")
+                retry_at = (now_dt() + timedelta(seconds=30)).strftime("%Y-%m-%d %H:%M:%S")
+                for invoice_code in due_codes:
+                    self.schedule(invoice_code, retry_at)
+                continue
+
+            if expired:
+                send_admin_log(embed=build_expired_embed(expired))
+
+
+expiry_scheduler = InvoiceExpiryScheduler()
+
+
+# Log aktivitas ditampung di queue lalu ditulis per batch dalam satu
+# transaksi, jadi handler tidak menunggu commit. Queue dibatasi: kalau penuh,
+# log_activity menunggu (back-pressure) sampai writer mengosongkannya.
+class ActivityLogWriter:
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._batch_ready = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.is_running():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="activity-log-writer")
+
+    async def put(self, row):
+        if not self.is_running() or self._stopping:
+            await run_db(insert_activity_logs, [row])
+            return
+
+        await self._queue.put(row)
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def flush(self):
+        if self.is_running():
+            self._batch_ready.set()
+            await self._queue.join()
 
-    @discord.ui.button(label="Cek Detail", style=discord.ButtonStyle.primary, custom_id="helper_lookup")
-    async def lookup(self, interaction: discord.Interaction, button: discord.ui.Button):
-        member = interaction.user
-        if not isinstance(member, discord.Member) or not is_helper_member(member):
-            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+    async def stop(self):
+        if not self.is_running():
             return
-        await interaction.response.send_modal(InvoiceLookupModal())
+        self._stopping = True
+        await self._queue.put(None)
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() + 1 < self.batch_size and batch[0] is not None:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            rows = [row for row in batch if row is not None]
+            if rows:
+                await self._write(rows)
+            for _ in batch:
+                self._queue.task_done()
+
+            if len(rows) < len(batch):
+                return
+
+    async def _write(self, rows):
+        for attempt in range(3):
+            try:
+                with track_task("activity_log_write"):
+                    await run_db(insert_activity_logs, rows)
+                return
+            except Exception:
+                log.exception("Gagal menulis %d log aktivitas (percobaan %d)", len(rows), attempt + 1)
+                await asyncio.sleep(1)
+        log.error("Log aktivitas dibuang: %r", rows)
 
-    @discord.ui.button(label="Diproses", style=discord.ButtonStyle.secondary, custom_id="helper_processing")
-    async def processing(self, interaction: discord.Interaction, button: discord.ui.Button):
-        member = interaction.user
-        if not isinstance(member, discord.Member) or not is_helper_member(member):
-            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
-            return
-        await interaction.response.send_modal(InvoiceActionModal("Tandai Diproses", "PROCESSING"))
 
-    @discord.ui.button(label="Selesai", style=discord.ButtonStyle.success, custom_id="helper_done")
-    async def done(self, interaction: discord.Interaction, button: discord.ui.Button):
-        member = interaction.user
-        if not isinstance(member, discord.Member) or not is_helper_member(member):
-            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
-            return
-        await interaction.response.send_modal(InvoiceActionModal("Tandai Selesai", "DONE"))
+activity_log_writer = ActivityLogWriter(LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
 
-@discord.ui.button(label="Konfirmasi Bayar", style=discord.ButtonStyle.success, custom_id="helper_pay")
-    async def pay(self, interaction: discord.Interaction, button: discord.ui.Button):
-        member = interaction.user
-        if not isinstance(member, discord.Member) or not is_helper_member(member):
-            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
-            return
-        await interaction.response.send_modal(PayInvoiceModal())
 
-    @discord.ui.button(label="Refresh", style=discord.ButtonStyle.primary, custom_id="helper_refresh")
-    async def refresh(self, interaction: discord.Interaction, button: discord.ui.Button):
-        member = interaction.user
-        if not isinstance(member, discord.Member) or not is_helper_member(member):
-            await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
-            return
+# Notifikasi ke channel admin dikirim dari background task. Event yang
+# menumpuk digabung jadi satu pesan (maks 10 embed / 2000 karakter) dan
+# pengiriman dibatasi 5 pesan per 5 detik, sesuai bucket per channel
+# Discord. Handler cukup memanggil send_admin_log tanpa await.
+class AdminNotifier:
+    MAX_EMBEDS = 10
+    MAX_CONTENT = 2000
+    MAX_EMBED_CHARS = 6000
 
-        log_activity(
-            str(member.id), str(member), actor_role(member),
-            "REFRESH_PANEL", "PANEL", "HELPER_PANEL",
-            "Refresh helper panel"
-        )
+    def __init__(self, maxsize: int, rate: int = 5, per: float = 5.0):
+        self.rate = rate
+        self.per = per
+        self.dropped = 0
+        self.sent_messages = 0
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._carry = None
+        self._sent_at = collections.deque(maxlen=rate)
+        self._task = None
 
-        await interaction.response.send_message(embed=build_pending_embed(), ephemeral=True)
+    def qsize(self):
+        return self._queue.qsize() + (1 if self._carry else 0)
 
+    def is_running(self):
+        return self._task is not None and not self._task.done()
 
-class MemberOrderPanelView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=None)
-        self.add_item(ProductSelect())
+    def start(self):
+        if not self.is_running():
+            self._task = asyncio.create_task(self._run(), name="admin-notifier")
 
-    @discord.ui.button(label="Refresh Produk", style=discord.ButtonStyle.primary, custom_id="member_refresh_products")
-    async def refresh_products(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message(
-            embed=build_member_order_embed(),
-            view=MemberOrderPanelView(),
-            ephemeral=True
-        )
+    def send(self, content=None, embed=None):
+        try:
+            self._queue.put_nowait((content, embed))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            log.warning("Queue notifikasi admin penuh, notifikasi dibuang (%d total)", self.dropped)
 
-    @discord.ui.button(label="Lihat Pending Invoice Saya", style=discord.ButtonStyle.secondary, custom_id="member_my_invoices")
-    async def my_invoices(self, interaction: discord.Interaction, button: discord.ui.Button):
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT invoice_code, product_name, quantity, total_price, status, due_at
-            FROM invoices
-            WHERE user_id = ?
-            ORDER BY id DESC
-            LIMIT 10
-        """, (str(interaction.user.id),))
-        rows = cur.fetchall()
-        conn.close()
+    async def stop(self, timeout: float = 5.0):
+        if not self.is_running():
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("%d notifikasi admin belum terkirim saat shutdown", self.qsize())
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _drain(self):
+        while self.qsize():
+            await asyncio.sleep(0.1)
+
+    def _next_batch(self, first):
+        contents = []
+        embeds = []
+        content_len = 0
+        embed_chars = 0
+
+        item = first
+        while item is not None:
+            content, embed = item
+            extra_content = len(content) + 1 if content else 0
+            extra_embed = len(embed) if embed else 0
+            fits = (
+                content_len + extra_content <= self.MAX_CONTENT
+                and len(embeds) + (1 if embed else 0) <= self.MAX_EMBEDS
+                and embed_chars + extra_embed <= self.MAX_EMBED_CHARS
+            )
+            if not fits and (contents or embeds):
+                self._carry = item
+                break
+
+            if content:
+                contents.append(content[:self.MAX_CONTENT])
+                content_len += extra_content
+            if embed:
+                embeds.append(embed)
+                embed_chars += extra_embed
+
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                item = None
+
+        return "\n".join(contents) or None, embeds
+
+    async def _wait_for_bucket(self):
+        loop = asyncio.get_running_loop()
+        if len(self._sent_at) == self.rate:
+            wait = self.per - (loop.time() - self._sent_at[0])
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._sent_at.append(loop.time())
+
+    async def _run(self):
+        while True:
+            if self._carry is not None:
+                first, self._carry = self._carry, None
+            else:
+                first = await self._queue.get()
+
+            # Tunggu bucket dulu supaya event yang datang selama menunggu ikut
+            # tergabung di pesan yang sama.
+            await self._wait_for_bucket()
+            content, embeds = self._next_batch(first)
+
+            channel = bot.get_channel(ADMIN_CHANNEL_ID)
+            if channel is None:
+                continue
+
+            try:
+                with track_task("admin_notify"):
+                    await channel.send(content=content, embeds=embeds)
+                self.sent_messages += 1
+            except discord.HTTPException:
+                log.exception("Gagal mengirim notifikasi admin")
 
-        embed = discord.Embed(
-            title="Invoice Saya",
-            color=discord.Color.blurple()
-        )
 
-        if not rows:
-            embed.description = "Kamu belum punya invoice."
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+admin_notifier = AdminNotifier(ADMIN_LOG_QUEUE_SIZE)
+
+
+# Metrik yang angkanya sudah disimpan objek lain dibaca saat /metrics diminta.
+metrics.collector(
+    "storebot_queue_depth", "gauge", "Isi queue dan antrean internal",
+    lambda: {
+        (("queue", "activity_log"),): activity_log_writer.qsize(),
+        (("queue", "admin_notifier"),): admin_notifier.qsize(),
+        (("queue", "db"),): _db_pending,
+        (("queue", "background_tasks"),): len(_background_tasks),
+        (("queue", "invoice_expiry"),): len(expiry_scheduler),
+    }
+)
+metrics.collector(
+    "storebot_cache_entries", "gauge", "Jumlah entri cache di memori",
+    lambda: {
+        (("cache", "products"),): len(product_catalog),
+        (("cache", "dm_channels"),): len(user_resolver),
+        (("cache", "carts"),): len(carts),
+    }
+)
+metrics.collector(
+    "storebot_user_lookups_total", "counter", "Lookup user dan DM channel per sumber",
+    lambda: {(("result", key),): value for key, value in user_resolver.stats.items()}
+)
+metrics.collector(
+    "storebot_cache_hit_ratio", "gauge", "Rasio hit cache user dan DM channel",
+    lambda: {(("cache", key),): value for key, value in user_resolver.hit_rates().items()}
+)
+metrics.collector(
+    "storebot_admin_notifications_total", "counter", "Pesan notifikasi admin terkirim dan dibuang",
+    lambda: {
+        (("result", "sent"),): admin_notifier.sent_messages,
+        (("result", "dropped"),): admin_notifier.dropped,
+    }
+)
+
+
+# Watchdog event loop. Task heartbeat di loop berdetak tiap INTERVAL detik
+# dan mencatat lag-nya; thread terpisah memeriksa detak terakhir. Kalau loop
+# tidak berdetak lebih dari LOOP_STALL_MS (0 = mati), thread mengambil stack
+# thread loop lewat sys._current_frames() -- yaitu kode sync yang sedang
+# memblokir -- lalu menulisnya ke log, dan paling sering sekali per
+# LOOP_STALL_ALERT_SECONDS ke channel admin.
+class LoopWatchdog:
+    INTERVAL = 0.1
+    STACK_LIMIT = 20
+
+    def __init__(self, threshold_ms: float, alert_interval: float):
+        self.threshold = threshold_ms / 1000
+        self.alert_interval = alert_interval
+        self.stalls = 0
+        self.suppressed = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._last_alert = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.threshold <= 0 or self.is_running():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
             return
+        self._stopping.set()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.INTERVAL
+            await asyncio.sleep(self.INTERVAL)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            self.max_lag = max(self.max_lag, lag)
+            metrics.observe("storebot_loop_lag_seconds", lag)
+            if lag >= self.threshold:
+                log.warning("Event loop kembali jalan setelah tertahan %.0f ms", lag * 1000)
+
+    def _watch(self):
+        reported = None
+        while not self._stopping.wait(self.INTERVAL):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.INTERVAL
+            if stalled < self.threshold or beat == reported:
+                continue
+
+            # Satu laporan per kejadian macet, diambil selagi loop masih tertahan.
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                stack = "(stack thread loop tidak tersedia)"
+            else:
+                stack = "".join(traceback.format_stack(frame, limit=self.STACK_LIMIT))
+            self._report(stalled, stack)
+
+    def _report(self, stalled: float, stack: str):
+        self.stalls += 1
+        metrics.inc("storebot_loop_stalls_total")
+        log.warning("Event loop macet >= %.0f ms, stack thread loop:\n%s", stalled * 1000, stack)
+
+        now = time.monotonic()
+        if self._last_alert is not None and now - self._last_alert < self.alert_interval:
+            self.suppressed += 1
+            return
+        self._last_alert = now
 
-        for code, product_name, qty, total, status, due_at in rows:
-            embed.add_field(
-                name=f"{code} | {status}",
-                value=f"{product_name} x{qty}\n{rupiah(total)}\nDue: {due_at}",
-                inline=False
+        try:
+            self._loop.call_soon_threadsafe(
+                functools.partial(send_admin_log, embed=build_loop_stall_embed(stalled, stack, self.suppressed))
             )
+        except RuntimeError:
+            pass
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
 
+loop_watchdog = LoopWatchdog(LOOP_STALL_MS, LOOP_STALL_ALERT_SECONDS)
 
-# =========================================================
-# TASKS
-# =========================================================
-@tasks.loop(minutes=1)
-async def invoice_expiry_loop():
-    expired_codes = expire_due_invoices()
-    if not expired_codes:
+
+# Satu run_db per batch, bukan satu job untuk seluruh backlog: thread DB
+# cuma satu, jadi order/bayar yang antre bisa jalan di sela-sela batch.
+async def archive_in_batches(func, *args, batch_size=ARCHIVE_BATCH_SIZE):
+    moved = 0
+    while True:
+        count = await run_db(func, *args, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+        await asyncio.sleep(0)
+
+
+# Job arsip berkala. Dipisah dari expiry scheduler karena tidak perlu presisi
+# waktu; cukup jalan tiap ARCHIVE_INTERVAL_MINUTES.
+@tasks.loop(minutes=ARCHIVE_INTERVAL_MINUTES)
+async def archive_old_rows():
+    try:
+        with track_task("archive_old_rows"):
+            boundary = await run_db(get_log_archive_boundary)
+            moved_logs = await archive_in_batches(archive_log_batch, boundary) if boundary else 0
+            moved_invoices = await archive_in_batches(archive_invoice_batch, get_invoice_archive_cutoff())
+    except Exception:
+        log.exception("Gagal mengarsip data lama")
         return
+    if moved_logs or moved_invoices:
+        log.info("Arsip: %d log aktivitas, %d invoice dipindah", moved_logs, moved_invoices)
 
-    for code in expired_codes:
-        log_activity(
-            "SYSTEM", "SYSTEM", "SYSTEM",
-            "AUTO_EXPIRE", "INVOICE", code,
-            "Invoice expired otomatis"
-        )
-        await send_admin_log(content=f"⏰ Invoice **{code}** otomatis berubah menjadi **EXPIRED**.")
+
+@archive_old_rows.before_loop
+async def before_archive_old_rows():
+    await bot.wait_until_ready()
 
 
 # =========================================================
@@ -1144,14 +4040,33 @@ async def invoice_expiry_loop():
 # =========================================================
 @bot.event
 async def on_ready():
-    init_db()
+    applied = await run_db(init_db)
+    if applied:
+        print(f"Migrasi database diterapkan: {applied}")
+
+    product_catalog.load(await run_db(get_all_products))
 
     bot.add_view(AdminPanelView())
     bot.add_view(HelperPanelView())
     bot.add_view(MemberOrderPanelView())
 
-    if not invoice_expiry_loop.is_running():
-        invoice_expiry_loop.start()
+    if not expiry_scheduler.is_running():
+        expiry_scheduler.load(await run_db(get_open_invoice_deadlines))
+        expiry_scheduler.start()
+
+    activity_log_writer.start()
+    admin_notifier.start()
+
+    if not archive_old_rows.is_running():
+        archive_old_rows.start()
+
+    loop_watchdog.start()
+
+    if METRICS_PORT and not metrics_server.is_running():
+        try:
+            await metrics_server.start()
+        except OSError:
+            log.exception("Gagal membuka endpoint metrik di port %d", METRICS_PORT)
 
     try:
         if GUILD_ID:
@@ -1166,9 +4081,28 @@ async def on_ready():
 
     print(f"Bot aktif sebagai {bot.user}")
 
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, command, "ok")
+
 # =========================================================
 # COMMANDS
 # =========================================================
+async def product_name_autocomplete(interaction: discord.Interaction, current: str):
+    # Value pilihan dibatasi Discord 100 karakter; nama yang lebih panjang
+    # akan terpotong dan tidak ketemu lagi, jadi tidak ditawarkan (nama
+    # lengkapnya masih bisa diketik manual).
+    return [
+        app_commands.Choice(
+            name=f"{name} | {rupiah(price)} | Stok {stock}"[:100],
+            value=name
+        )
+        for _product_id, name, price, stock, _description in product_catalog.search(current)
+        if len(name) <= 100
+    ]
+
+
 @bot.tree.command(name="deploypanels", description="Deploy semua panel ke channel panel")
 async def deploypanels(interaction: discord.Interaction):
     member = interaction.user
@@ -1197,7 +4131,7 @@ async def deploypanels(interaction: discord.Interaction):
     await channel.send(embed=helper_embed, view=HelperPanelView())
     await channel.send(embed=member_embed, view=MemberOrderPanelView())
 
-    log_activity(
+    await log_activity(
         str(member.id), str(member), actor_role(member),
         "DEPLOY_PANELS", "CHANNEL", str(PANEL_CHANNEL_ID),
         "Deploy admin, helper, dan member order panel"
@@ -1224,7 +4158,7 @@ async def deployorderpanel(interaction: discord.Interaction):
     embed = build_member_order_embed()
     await channel.send(embed=embed, view=MemberOrderPanelView())
 
-    log_activity(
+    await log_activity(
         str(member.id), str(member), actor_role(member),
         "DEPLOY_ORDER_PANEL", "CHANNEL", str(PANEL_CHANNEL_ID),
         "Deploy panel order member"
@@ -1277,7 +4211,70 @@ async def dashboard(interaction: discord.Interaction):
     if not isinstance(member, discord.Member) or not is_helper_member(member):
         await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
         return
-    await interaction.response.send_message(embed=build_dashboard_embed(), ephemeral=True)
+    data = await run_db(get_dashboard_data)
+    await interaction.response.send_message(embed=build_dashboard_embed(data), ephemeral=True)
+
+
+@bot.tree.command(name="cekdashboard", description="Hitung ulang dan perbaiki counter dashboard")
+async def cekdashboard(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    mismatches = await run_db(check_dashboard_stats, True)
+
+    if not mismatches:
+        await interaction.followup.send("✅ Counter dashboard sudah sesuai.", ephemeral=True)
+        return
+
+    await log_activity(
+        str(member.id), str(member), actor_role(member),
+        "REPAIR_DASHBOARD", "DASHBOARD", "STATS",
+        ", ".join(f"{key}: {old}->{new}" for key, (old, new) in mismatches.items())
+    )
+
+    lines = [f"`{key}`: {old} → {new}" for key, (old, new) in mismatches.items()]
+    await interaction.followup.send(
+        "🛠️ Counter dashboard diperbaiki:\n" + "\n".join(lines),
+        ephemeral=True
+    )
+
+
+@bot.tree.command(name="botstats", description="Lihat statistik cache dan notifikasi bot")
+async def botstats(interaction: discord.Interaction):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+    await interaction.response.send_message(embed=build_bot_stats_embed(), ephemeral=True)
+
+
+@bot.tree.command(name="querylambat", description="Lihat query database paling lambat")
+@app_commands.describe(
+    urut="Urutkan berdasarkan total waktu, durasi maksimum, atau jumlah kejadian",
+    jumlah="Jumlah query yang ditampilkan (1-10)",
+    reset="Kosongkan statistik setelah ditampilkan"
+)
+@app_commands.choices(urut=[
+    app_commands.Choice(name="Total waktu", value="total"),
+    app_commands.Choice(name="Paling lama", value="max"),
+    app_commands.Choice(name="Paling sering", value="count"),
+])
+async def querylambat(interaction: discord.Interaction, urut: str = "total",
+                      jumlah: app_commands.Range[int, 1, 10] = 5, reset: bool = False):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+
+    embed = build_slow_query_embed(slow_queries.top(jumlah, urut), urut)
+    if reset:
+        slow_queries.reset()
+        embed.set_footer(text="Statistik query lambat sudah dikosongkan.")
+
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 @bot.tree.command(name="logs", description="Lihat log aktivitas terbaru")
@@ -1286,7 +4283,29 @@ async def logs(interaction: discord.Interaction):
     if not isinstance(member, discord.Member) or not is_admin_member(member):
         await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
         return
-    await interaction.response.send_message(embed=build_logs_embed(), ephemeral=True)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await activity_log_writer.flush()
+    await PaginatedView.send(
+        interaction,
+        functools.partial(run_db, get_recent_logs, PAGE_SIZE),
+        build_logs_embed
+    )
+
+
+@bot.tree.command(name="logarsip", description="Lihat log aktivitas yang sudah diarsip")
+@app_commands.describe(target="Filter target persis, mis. kode invoice (opsional)")
+async def logarsip(interaction: discord.Interaction, target: str | None = None):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+
+    title = f"Arsip Log: {target}" if target else "Arsip Log Aktivitas"
+    await PaginatedView.send(
+        interaction,
+        functools.partial(run_db, get_archived_logs, target.strip() if target else None, PAGE_SIZE),
+        functools.partial(build_logs_embed, title=title)
+    )
 
 
 @bot.tree.command(name="addproduk", description="Tambah produk")
@@ -1298,16 +4317,9 @@ async def addproduk(interaction: discord.Interaction, nama: str, harga: int, sto
         return
 
     try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO products (name, price, stock, description)
-            VALUES (?, ?, ?, ?)
-        """, (nama, harga, stok, deskripsi))
-        conn.commit()
-        conn.close()
+        await run_db(create_product, nama, harga, stok, deskripsi)
 
-        log_activity(
+        await log_activity(
             str(member.id), str(member), actor_role(member),
             "ADD_PRODUCT", "PRODUCT", nama,
             f"Harga={harga}, Stok={stok}"
@@ -1320,24 +4332,20 @@ async def addproduk(interaction: discord.Interaction, nama: str, harga: int, sto
 
 @bot.tree.command(name="setstok", description="Ubah stok produk")
 @app_commands.describe(nama="Nama produk", stok="Stok baru")
+@app_commands.autocomplete(nama=product_name_autocomplete)
 async def setstok(interaction: discord.Interaction, nama: str, stok: int):
     member = interaction.user
     if not isinstance(member, discord.Member) or not is_admin_member(member):
         await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE products SET stock = ? WHERE LOWER(name)=LOWER(?)", (stok, nama))
-    conn.commit()
-    changed = cur.rowcount
-    conn.close()
+    changed = await run_db(set_product_stock, nama, stok)
 
     if changed == 0:
         await interaction.response.send_message("❌ Produk tidak ditemukan.", ephemeral=True)
         return
 
-    log_activity(
+    await log_activity(
         str(member.id), str(member), actor_role(member),
         "SET_STOCK", "PRODUCT", nama,
         f"Stok baru={stok}"
@@ -1346,42 +4354,72 @@ async def setstok(interaction: discord.Interaction, nama: str, stok: int):
     await interaction.response.send_message(f"✅ Stok **{nama}** jadi **{stok}**.", ephemeral=True)
 
 
+@bot.tree.command(name="restokmassal", description="Ubah stok banyak produk sekaligus (CSV atau form)")
+@app_commands.describe(file="CSV berisi kolom nama,stok (stok +N/-N untuk menambah/mengurangi)")
+async def restokmassal(interaction: discord.Interaction, file: discord.Attachment | None = None):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+
+    if file is None:
+        await interaction.response.send_modal(BulkStockModal())
+        return
+
+    if file.size > 256 * 1024:
+        await interaction.response.send_message("❌ File CSV maksimal 256 KB.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except (discord.HTTPException, UnicodeDecodeError):
+        await interaction.followup.send("❌ File tidak bisa dibaca sebagai CSV UTF-8.", ephemeral=True)
+        return
+
+    await run_bulk_restock(interaction, member, parse_stock_rows(text))
+
+
+@bot.tree.command(name="bayarmassal", description="Konfirmasi bayar banyak invoice sekaligus")
+@app_commands.describe(kode="Kode invoice, pisahkan dengan spasi atau koma")
+async def bayarmassal(interaction: discord.Interaction, kode: str):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+    await run_bulk_payment(interaction, member, parse_invoice_codes(kode))
+
+
+@bot.tree.command(name="batalmassal", description="Batalkan banyak invoice sekaligus")
+@app_commands.describe(kode="Kode invoice, pisahkan dengan spasi atau koma", alasan="Alasan cancel")
+async def batalmassal(interaction: discord.Interaction, kode: str, alasan: str | None = None):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+    await run_bulk_cancel(interaction, member, parse_invoice_codes(kode), alasan)
+
+
 @bot.tree.command(name="listproduk", description="Lihat daftar produk")
 async def listproduk(interaction: discord.Interaction):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT name, price, stock, description FROM products ORDER BY id ASC")
-    rows = cur.fetchall()
-    conn.close()
-
-    if not rows:
+    if not len(product_catalog):
         await interaction.response.send_message("Belum ada produk.", ephemeral=True)
         return
 
-    embed = discord.Embed(title="Daftar Produk", color=discord.Color.blue())
-    for name, price, stock, description in rows:
-        embed.add_field(
-            name=f"{name} | {rupiah(price)}",
-            value=f"Stok: **{stock}**\n{description or '-'}",
-            inline=False
-        )
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await PaginatedView.send(interaction, fetch_product_page, build_product_list_embed)
 
 
 @bot.tree.command(name="stok", description="Cek stok produk")
 @app_commands.describe(nama="Nama produk")
+@app_commands.autocomplete(nama=product_name_autocomplete)
 async def stok(interaction: discord.Interaction, nama: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT name, price, stock, description FROM products WHERE LOWER(name)=LOWER(?)", (nama,))
-    row = cur.fetchone()
-    conn.close()
+    row = product_catalog.find(nama)
 
     if not row:
         await interaction.response.send_message("❌ Produk tidak ditemukan.", ephemeral=True)
         return
 
-    name, price, stock_value, description = row
+    _product_id, name, price, stock_value, description = row
     embed = discord.Embed(title=f"Stok Produk: {name}", color=discord.Color.green())
     embed.add_field(name="Harga", value=rupiah(price), inline=True)
     embed.add_field(name="Stok", value=str(stock_value), inline=True)
@@ -1391,94 +4429,78 @@ async def stok(interaction: discord.Interaction, nama: str):
 
 @bot.tree.command(name="order", description="Buat invoice otomatis")
 @app_commands.describe(nama="Nama produk", jumlah="Jumlah beli")
+@app_commands.autocomplete(nama=product_name_autocomplete)
 async def order(interaction: discord.Interaction, nama: str, jumlah: int):
     if jumlah <= 0:
         await interaction.response.send_message("❌ Jumlah harus lebih dari 0.", ephemeral=True)
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, price, stock FROM products WHERE LOWER(name)=LOWER(?)", (nama,))
-    product = cur.fetchone()
+    product = product_catalog.find(nama)
 
     if not product:
-        conn.close()
         await interaction.response.send_message("❌ Produk tidak ditemukan.", ephemeral=True)
         return
 
-    product_id, product_name, unit_price, stock_value = product
+    product_id, product_name, _unit_price, _stock_value, _description = product
 
-    if stock_value < jumlah:
-        conn.close()
-        await interaction.response.send_message(
-            f"❌ Stok tidak cukup. Stok tersedia: **{stock_value}**",
-            ephemeral=True
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    try:
+        result = await run_db(
+            create_invoice,
+            str(interaction.user.id), str(interaction.user),
+            [(product_id, jumlah)]
         )
+    except Exception as e:
+        await interaction.followup.send(f"❌ Gagal membuat invoice: {e}", ephemeral=True)
         return
 
-    invoice_code = generate_invoice_code()
-    total_price = unit_price * jumlah
-    created_at = now_str()
-    due_at = (now_dt() + timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
-
-    try:
-        cur.execute("""
-            INSERT INTO invoices (
-                invoice_code, user_id, username, product_id, product_name,
-                quantity, unit_price, total_price, status, created_at, due_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            invoice_code,
-            str(interaction.user.id),
-            str(interaction.user),
-            product_id,
-            product_name,
-            jumlah,
-            unit_price,
-            total_price,
-            "UNPAID",
-            created_at,
-            due_at
-        ))
-        conn.commit()
-        conn.close()
+    if not result["ok"]:
+        await interaction.followup.send(f"❌ {result['message']}", ephemeral=True)
+        return
 
-        row = get_invoice_detail(invoice_code)
-        embed = build_invoice_embed(row)
+    row = result["invoice"]
+    invoice_code = row[0]
+    expiry_scheduler.schedule(invoice_code, row[8])
+    embed = build_invoice_embed(row)
 
-        log_activity(
-            str(interaction.user.id), str(interaction.user), "USER",
-            "CREATE_ORDER", "INVOICE", invoice_code,
-            f"{product_name} x{jumlah}"
-        )
+    await interaction.followup.send(
+        f"✅ Invoice berhasil dibuat: **{invoice_code}**\nCek DM kamu untuk detail invoice.",
+        ephemeral=True
+    )
 
-        await interaction.response.send_message(
-            f"✅ Invoice berhasil dibuat: **{invoice_code}**\nCek DM kamu untuk detail invoice.",
-            ephemeral=True
-        )
+    spawn_background(deliver_dm(
+        interaction.user,
+        interaction=interaction,
+        fallback="⚠️ Aku tidak bisa kirim DM. Aktifkan DM server ya.",
+        content="Berikut invoice pesanan kamu:",
+        embed=embed
+    ))
 
-        try:
-            await interaction.user.send("Berikut invoice pesanan kamu:", embed=embed)
-        except Exception:
-            await interaction.followup.send(
-                "⚠️ Aku tidak bisa kirim DM. Aktifkan DM server ya.",
-                ephemeral=True
-            )
+    await log_activity(
+        str(interaction.user.id), str(interaction.user), "USER",
+        "CREATE_ORDER", "INVOICE", invoice_code,
+        f"{product_name} x{jumlah}"
+    )
 
-        await send_admin_log(
-            content=f"🧾 Invoice baru dari {interaction.user.mention}",
-            embed=embed
-        )
+    send_admin_log(
+        content=f"🧾 Invoice baru dari {interaction.user.mention}",
+        embed=embed
+    )
 
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        await interaction.response.send_message(f"❌ Gagal membuat invoice: {e}", ephemeral=True)
 
 @bot.tree.command(name="invoice", description="Lihat detail invoice")
 @app_commands.describe(kode="Kode invoice")
 async def invoice(interaction: discord.Interaction, kode: str):
-    row = get_invoice_detail(kode)
+    # Kode invoice urut waktu sehingga bisa ditebak; detail hanya untuk
+    # pemilik invoice atau helper/admin. Invoice milik orang lain dijawab
+    # "tidak ditemukan" supaya keberadaannya juga tidak bocor.
+    member = interaction.user
+    owner = await run_db(get_invoice_owner, kode)
+    is_staff = isinstance(member, discord.Member) and is_helper_member(member)
+    row = None
+    if owner is not None and (owner == str(member.id) or is_staff):
+        row = await run_db(get_invoice_detail, kode)
     if not row:
         await interaction.response.send_message("❌ Invoice tidak ditemukan.", ephemeral=True)
         return
@@ -1491,7 +4513,59 @@ async def pendinginvoice(interaction: discord.Interaction):
     if not isinstance(member, discord.Member) or not is_helper_member(member):
         await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
         return
-    await interaction.response.send_message(embed=build_pending_embed(), ephemeral=True)
+    await PaginatedView.send(
+        interaction,
+        functools.partial(run_db, get_pending_invoices, PAGE_SIZE),
+        build_pending_embed
+    )
+
+
+@bot.tree.command(name="cari", description="Cari invoice atau log aktivitas")
+@app_commands.describe(
+    kata="Kode invoice, username, nama produk, catatan, atau detail log",
+    sumber="Cari di invoice atau log aktivitas"
+)
+@app_commands.choices(sumber=[
+    app_commands.Choice(name="Invoice", value="invoice"),
+    app_commands.Choice(name="Log Aktivitas", value="log"),
+])
+async def cari(interaction: discord.Interaction, kata: str, sumber: str = "invoice"):
+    member = interaction.user
+    if not isinstance(member, discord.Member) or not is_helper_member(member):
+        await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
+        return
+
+    if sumber == "log" and not is_admin_member(member):
+        await interaction.response.send_message("Tidak punya akses admin.", ephemeral=True)
+        return
+
+    if not build_fts_query(kata):
+        await interaction.response.send_message("❌ Kata kunci tidak valid.", ephemeral=True)
+        return
+
+    # log_activity bisa menunggu saat antrean penuh dan flush menunggu batch
+    # berjalan; defer dulu supaya tidak lewat batas 3 detik acknowledge.
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await log_activity(
+        str(member.id), str(member), actor_role(member),
+        "SEARCH", "LOG" if sumber == "log" else "INVOICE", kata[:100],
+        f"Mencari {sumber}"
+    )
+
+    if sumber == "log":
+        await activity_log_writer.flush()
+        await PaginatedView.send(
+            interaction,
+            functools.partial(run_db, search_logs, kata, PAGE_SIZE),
+            functools.partial(build_logs_embed, title=f"Hasil Cari Log: {kata}")
+        )
+        return
+
+    await PaginatedView.send(
+        interaction,
+        functools.partial(run_db, search_invoices, kata, PAGE_SIZE),
+        functools.partial(build_invoice_search_embed, kata)
+    )
 
 
 @bot.tree.command(name="bayar", description="Konfirmasi invoice sudah dibayar")
@@ -1502,37 +4576,45 @@ async def bayar(interaction: discord.Interaction, invoice_code: str):
         await interaction.response.send_message("Tidak punya akses helper/admin.", ephemeral=True)
         return
 
-    result = confirm_payment_and_reduce_stock(invoice_code, str(member))
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    result = await run_db(confirm_payment_and_reduce_stock, invoice_code, str(member))
     if not result["ok"]:
-        await interaction.response.send_message(f"❌ {result['message']}", ephemeral=True)
+        await interaction.followup.send(f"❌ {result['message']}", ephemeral=True)
         return
 
-    log_activity(
-        str(member.id), str(member), actor_role(member),
-        "CONFIRM_PAYMENT", "INVOICE", invoice_code,
-        f"Produk={result['product_name']}, Qty={result['quantity']}, StokSisa={result['new_stock']}"
-    )
+    expiry_scheduler.discard(invoice_code)
 
-    await interaction.response.send_message(
+    await interaction.followup.send(
         f"✅ Invoice **{invoice_code}** berhasil dibayar.\n"
         f"Stok baru: **{result['new_stock']}**",
         ephemeral=True
     )
 
-    try:
-        user = await bot.fetch_user(int(result["user_id"]))
-        embed = discord.Embed(title="Pembayaran Diterima", color=discord.Color.green())
-        embed.add_field(name="Invoice", value=invoice_code, inline=False)
-        embed.add_field(name="Produk", value=result["product_name"], inline=False)
-        embed.add_field(name="Qty", value=str(result["quantity"]), inline=True)
-        embed.add_field(name="Total", value=rupiah(result["total_price"]), inline=True)
-        embed.add_field(name="Status", value="PAID", inline=True)
-        await user.send(embed=embed)
-    except Exception:
-        pass
+    spawn_background(deliver_dm(
+        int(result["user_id"]),
+        interaction=interaction,
+        fallback="⚠️ DM konfirmasi ke customer gagal dikirim.",
+        embed=build_payment_dm_embed(invoice_code, result)
+    ))
+
+    await log_activity(
+        str(member.id), str(member), actor_role(member),
+        "CONFIRM_PAYMENT", "INVOICE", invoice_code,
+        f"Produk={result['product_name']}, Qty={result['quantity']}, StokSisa={result['new_stock']}"
+    )
 
 
 if __name__ == "__main__":
     if not TOKEN:
         raise ValueError("DISCORD_TOKEN belum diisi di file .env")
+    # bot.run hanya memasang handler di logger "discord". Logger "storebot"
+    # (query lambat, event loop macet, scheduler) diberi handler sendiri
+    # dengan format yang sama, tanpa mengubah konfigurasi root logger.
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter(
+        "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
+    ))
+    log.addHandler(log_handler)
+    log.setLevel(logging.INFO)
     bot.run(TOKEN)
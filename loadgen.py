@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import types
+
+import discord
+
+import bot
+from bench import summarize
+
+
+# =========================================================
+# Load generator end-to-end tanpa Discord. Handler asli (order, panel
+# member, bayar, tombol admin/helper) dipanggil dengan Interaction, Member
+# dan response palsu; panggilan REST diganti sleep dengan latency acak.
+# Hasil JSON: latency per handler, lag event loop, SQLITE_BUSY dan
+# pengecekan oversell stok di akhir run.
+#
+#   python loadgen.py --orders-per-minute 500 --duration 60
+# =========================================================
+INVOICE_CODE_PATTERN = re.compile(r"INV-\d{8}-[0-9A-Z]+")
+
+
+def is_busy_error(text: str) -> bool:
+    text = text.lower()
+    return "database is locked" in text or "database is busy" in text
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, kind, payload):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        await self._interaction.harness.rest_call()
+        self._interaction.sent.append((kind, payload))
+
+    async def defer(self, **kwargs):
+        await self._respond("defer", kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond("send_message", dict(kwargs, content=content))
+
+    async def edit_message(self, **kwargs):
+        await self._respond("edit_message", kwargs)
+
+    async def send_modal(self, modal):
+        await self._respond("send_modal", {"modal": modal})
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        if not self._interaction.response.is_done():
+            raise RuntimeError("followup dikirim sebelum interaction direspon")
+        await self._interaction.harness.rest_call()
+        self._interaction.sent.append(("followup", dict(kwargs, content=content)))
+
+
+class FakeInteraction:
+    def __init__(self, harness, user):
+        self.harness = harness
+        self.user = user
+        self.guild = None
+        self.client = bot.bot
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def texts(self):
+        return [payload.get("content") or "" for _kind, payload in self.sent]
+
+    def modal(self):
+        for kind, payload in self.sent:
+            if kind == "send_modal":
+                return payload["modal"]
+        return None
+
+
+# Subclass discord.Member supaya lolos isinstance() di handler; atribut yang
+# dipakai bot (id, nama, role, permission, send) diisi langsung.
+class FakeMember(discord.Member):
+    def __init__(self, harness, user_id: int, name: str, roles=(), administrator: bool = False):
+        self.harness = harness
+        self._fake_id = user_id
+        self._fake_name = name
+        self._fake_roles = [types.SimpleNamespace(name=role) for role in roles]
+        self._fake_permissions = discord.Permissions(administrator=administrator)
+
+    id = property(lambda self: self._fake_id)
+    name = property(lambda self: self._fake_name)
+    display_name = property(lambda self: self._fake_name)
+    mention = property(lambda self: f"<@{self._fake_id}>")
+    roles = property(lambda self: self._fake_roles)
+    guild_permissions = property(lambda self: self._fake_permissions)
+    dm_channel = property(lambda self: self)
+
+    def __str__(self):
+        return self._fake_name
+
+    def __repr__(self):
+        return f"<FakeMember id={self._fake_id} name={self._fake_name!r}>"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self._fake_id)
+
+    async def send(self, content=None, **kwargs):
+        await self.harness.rest_call()
+        self.harness.dms += 1
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.latency = collections.defaultdict(list)
+        self.outcomes = collections.defaultdict(collections.Counter)
+        self.errors = collections.Counter()
+        self.busy_errors = 0
+        self.rest_calls = 0
+        self.dms = 0
+        self.admin_notifications = 0
+        self.unpaid = collections.deque()
+        self.paid = collections.deque()
+        self.loop_lag = []
+
+        self.members = [
+            FakeMember(self, 100000 + index, f"member{index}")
+            for index in range(args.users)
+        ]
+        self.helpers = [
+            FakeMember(self, 200000 + index, f"helper{index}", roles=(bot.HELPER_ROLE_NAME,))
+            for index in range(args.helpers)
+        ]
+        self.admins = [
+            FakeMember(self, 300000 + index, f"admin{index}", administrator=True)
+            for index in range(args.admins)
+        ]
+
+    async def rest_call(self):
+        self.rest_calls += 1
+        await asyncio.sleep(random.uniform(self.args.rest_min_ms, self.args.rest_max_ms) / 1000)
+
+    async def call(self, name, handler, interaction, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            await handler(interaction, *args, **kwargs)
+        except Exception as e:
+            self.outcomes[name]["error"] += 1
+            self.errors[f"{name}: {type(e).__name__}: {e}"] += 1
+            if isinstance(e, sqlite3.OperationalError) and is_busy_error(str(e)):
+                self.busy_errors += 1
+            return
+        finally:
+            self.latency[name].append(time.perf_counter() - start)
+
+        texts = interaction.texts()
+        if any(is_busy_error(text) for text in texts):
+            self.busy_errors += 1
+        if any(text.startswith("❌") for text in texts):
+            self.outcomes[name]["rejected"] += 1
+        else:
+            self.outcomes[name]["ok"] += 1
+
+        for text in texts:
+            if text.startswith(("✅ Invoice berhasil dibuat", "✅ Order berhasil")):
+                match = INVOICE_CODE_PATTERN.search(text)
+                if match:
+                    self.unpaid.append(match.group(0))
+
+    # -----------------------------------------------------
+    # Aksi member
+    # -----------------------------------------------------
+    async def member_order_command(self):
+        product = random.choice(bot.product_catalog.page(25).rows)
+        interaction = FakeInteraction(self, random.choice(self.members))
+        await self.call(
+            "order", bot.order.callback, interaction,
+            nama=product[1], jumlah=random.randint(1, self.args.max_quantity)
+        )
+
+    async def member_order_panel(self):
+        member = random.choice(self.members)
+        view = bot.MemberOrderPanelView()
+        select = next(item for item in view.children if isinstance(item, bot.ProductSelect))
+        select._values = [random.choice(select.options).value]
+
+        interaction = FakeInteraction(self, member)
+        await self.call("ProductSelect.callback", select.callback, interaction)
+        modal = interaction.modal()
+        if modal is None:
+            return
+
+        modal.quantity._value = str(random.randint(1, self.args.max_quantity))
+        await self.call("MemberOrderModal.on_submit", modal.on_submit, FakeInteraction(self, member))
+
+    # -----------------------------------------------------
+    # Aksi staff
+    # -----------------------------------------------------
+    async def staff_bayar(self):
+        if not self.unpaid:
+            return
+        code = self.unpaid.popleft()
+        interaction = FakeInteraction(self, random.choice(self.helpers + self.admins))
+        await self.call("bayar", bot.bayar.callback, interaction, invoice_code=code)
+        if not any(text.startswith("❌") for text in interaction.texts()):
+            self.paid.append(code)
+
+    async def staff_pay_modal(self):
+        if not self.unpaid:
+            return
+        code = self.unpaid.popleft()
+        admin = random.choice(self.admins)
+        view = bot.AdminPanelView()
+
+        interaction = FakeInteraction(self, admin)
+        await self.call("AdminPanelView.pay", view.pay.callback, interaction)
+        modal = interaction.modal()
+        if modal is None:
+            return
+
+        modal.invoice_code._value = code
+        interaction = FakeInteraction(self, admin)
+        await self.call("PayInvoiceModal.on_submit", modal.on_submit, interaction)
+        if not any(text.startswith("❌") for text in interaction.texts()):
+            self.paid.append(code)
+
+    async def staff_done(self):
+        if not self.paid:
+            return
+        code = self.paid.popleft()
+        helper = random.choice(self.helpers)
+        view = bot.HelperPanelView()
+
+        interaction = FakeInteraction(self, helper)
+        await self.call("HelperPanelView.done", view.done.callback, interaction)
+        modal = interaction.modal()
+        if modal is None:
+            return
+
+        modal.invoice_code._value = code
+        await self.call("InvoiceActionModal.on_submit", modal.on_submit, FakeInteraction(self, helper))
+
+    async def admin_button(self):
+        view = bot.AdminPanelView()
+        name = random.choice(("dashboard", "pending", "logs", "refresh"))
+        await self.call(
+            f"AdminPanelView.{name}", getattr(view, name).callback,
+            FakeInteraction(self, random.choice(self.admins))
+        )
+
+    async def helper_button(self):
+        view = bot.HelperPanelView()
+        name = random.choice(("pending", "refresh"))
+        await self.call(
+            f"HelperPanelView.{name}", getattr(view, name).callback,
+            FakeInteraction(self, random.choice(self.helpers))
+        )
+
+    # -----------------------------------------------------
+    # Penggerak beban
+    # -----------------------------------------------------
+    async def arrivals(self, per_minute, actions, tasks):
+        if per_minute <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.args.duration
+        while loop.time() < end:
+            await asyncio.sleep(random.expovariate(per_minute / 60))
+            tasks.add(asyncio.create_task(random.choice(actions)()))
+
+    async def monitor_loop_lag(self, stop, interval=0.05):
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - interval))
+
+    async def drain_admin_notifications(self):
+        # Pengganti AdminNotifier._run: tidak ada channel admin, cukup dihitung.
+        while True:
+            await bot.admin_notifier._queue.get()
+            self.admin_notifications += 1
+
+
+def external_writer(stop, hold_ms, stats):
+    # Proses lain (mis. script maintenance) yang memegang write lock sebentar,
+    # supaya contention dan SQLITE_BUSY ikut teruji.
+    conn = sqlite3.connect(bot.DB_NAME, timeout=bot.DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    while not stop.is_set():
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE dashboard_stats SET value = value WHERE key = 'invoices'")
+            time.sleep(hold_ms / 1000)
+            conn.execute("COMMIT")
+            stats["writes"] += 1
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if is_busy_error(str(e)):
+                stats["busy"] += 1
+        time.sleep(random.uniform(0.01, 0.05))
+    conn.close()
+
+
+def check_stock(initial_stock):
+    # Stok yang tertahan = item di invoice yang tidak dibatalkan/expired.
+    # stok sekarang + tertahan harus sama dengan stok awal, dan cache katalog
+    # harus sama dengan database.
+    cur = bot.get_conn().cursor()
+    cur.execute("""
+        SELECT p.id, p.name, p.stock,
+               COALESCE(SUM(CASE WHEN i.status NOT IN ('CANCELLED', 'EXPIRED') THEN it.quantity END), 0)
+        FROM products p
+        LEFT JOIN invoice_items it ON it.product_id = p.id
+        LEFT JOIN invoices i ON i.id = it.invoice_id
+        GROUP BY p.id
+    """)
+    incidents = []
+    for product_id, name, stock, held in cur.fetchall():
+        cached = bot.product_catalog.get(product_id)
+        if stock < 0 or held > initial_stock or stock + held != initial_stock:
+            incidents.append({"product": name, "stock": stock, "held": held, "initial": initial_stock})
+        if cached is None or cached[3] != stock:
+            incidents.append({"product": name, "stock": stock, "cached_stock": cached and cached[3]})
+    return incidents
+
+
+async def run_load(args, harness):
+    bot.activity_log_writer.start()
+    drain_task = asyncio.create_task(harness.drain_admin_notifications())
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(harness.monitor_loop_lag(stop))
+
+    writer_stop = threading.Event()
+    writer_stats = collections.Counter()
+    writers = [
+        threading.Thread(target=external_writer, args=(writer_stop, args.writer_hold_ms, writer_stats), daemon=True)
+        for _ in range(args.external_writers)
+    ]
+    for thread in writers:
+        thread.start()
+
+    tasks = set()
+    start = time.perf_counter()
+    await asyncio.gather(
+        harness.arrivals(args.orders_per_minute, (harness.member_order_command, harness.member_order_panel), tasks),
+        harness.arrivals(args.payments_per_minute, (harness.staff_bayar, harness.staff_pay_modal), tasks),
+        harness.arrivals(args.staff_per_minute, (harness.admin_button, harness.helper_button, harness.staff_done), tasks),
+    )
+    if tasks:
+        await asyncio.wait(tasks)
+    while bot._background_tasks:
+        await asyncio.wait(set(bot._background_tasks))
+    elapsed = time.perf_counter() - start
+
+    writer_stop.set()
+    for thread in writers:
+        thread.join()
+
+    stop.set()
+    await lag_task
+    await bot.activity_log_writer.stop()
+    drain_task.cancel()
+    return elapsed, writer_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator handler store bot")
+    parser.add_argument("--duration", type=float, default=30, help="lama beban (detik)")
+    parser.add_argument("--orders-per-minute", type=float, default=500, help="order member per menit")
+    parser.add_argument("--payments-per-minute", type=float, default=300, help="konfirmasi bayar per menit")
+    parser.add_argument("--staff-per-minute", type=float, default=120, help="klik panel admin/helper per menit")
+    parser.add_argument("--users", type=int, default=500, help="jumlah member palsu")
+    parser.add_argument("--helpers", type=int, default=3, help="jumlah helper palsu")
+    parser.add_argument("--admins", type=int, default=2, help="jumlah admin palsu")
+    parser.add_argument("--products", type=int, default=20, help="jumlah produk")
+    parser.add_argument("--stock", type=int, default=300, help="stok awal per produk")
+    parser.add_argument("--max-quantity", type=int, default=3, help="jumlah maksimal per order")
+    parser.add_argument("--rest-min-ms", type=float, default=20, help="latency REST Discord minimum")
+    parser.add_argument("--rest-max-ms", type=float, default=120, help="latency REST Discord maksimum")
+    parser.add_argument("--external-writers", type=int, default=0, help="thread penulis lain untuk contention")
+    parser.add_argument("--writer-hold-ms", type=float, default=50, help="lama write lock penulis lain")
+    parser.add_argument("--dir", help="folder database (default: folder sementara)")
+    parser.add_argument("--output", help="tulis JSON ke file ini (default: stdout)")
+    parser.add_argument("--seed", type=int, default=1, help="seed random")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    random.seed(args.seed)
+    workdir = args.dir or tempfile.mkdtemp(prefix="storebot-load-")
+    os.makedirs(workdir, exist_ok=True)
+    bot.DB_NAME = os.path.join(workdir, "store.db")
+    bot.ARCHIVE_DB_NAME = os.path.join(workdir, "store_archive.db")
+
+    try:
+        bot.init_db()
+        for index in range(args.products):
+            bot.create_product(f"Produk {index:03d}", 1000 * (index + 1), args.stock, f"Produk uji {index}")
+        bot.product_catalog.load(bot.get_all_products())
+
+        harness = Harness(args)
+        bot.user_resolver.maxsize = max(bot.user_resolver.maxsize, args.users)
+        for member in harness.members:
+            bot.user_resolver._channels[member.id] = member
+
+        elapsed, writer_stats = asyncio.run(run_load(args, harness))
+        incidents = check_stock(args.stock)
+
+        report = {
+            "config": vars(args) | {"dir": workdir},
+            "elapsed_s": round(elapsed, 3),
+            "handlers": {
+                name: summarize(samples, **dict(harness.outcomes[name]))
+                for name, samples in sorted(harness.latency.items())
+            },
+            "event_loop_lag": summarize(harness.loop_lag),
+            "sqlite_busy": harness.busy_errors,
+            "external_writer": dict(writer_stats),
+            "oversell_incidents": incidents,
+            "errors": dict(harness.errors.most_common(20)),
+            "rest_calls": harness.rest_calls,
+            "dms_sent": harness.dms,
+            "admin_notifications": harness.admin_notifications,
+            "invoices_left_unpaid": len(harness.unpaid),
+        }
+    finally:
+        bot.close_conn()
+        # Folder sementara dihapus; folder dari --dir dibiarkan untuk diperiksa.
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()